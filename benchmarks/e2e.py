@@ -0,0 +1,196 @@
+from asyncio import get_event_loop, sleep
+from sys import stderr
+from time import monotonic
+
+from click import Choice as CHOICE, FLOAT, INT, Path as PATH, command, option
+
+from fakeapi import FakeKubernetes
+
+from fixtures import FakeAPI, alfa_template, generate
+
+from illallangi.alfa.cluster import Controller
+from illallangi.alfa.dump import BACKENDS, BlobBackend, DumpWriter, POLICIES
+from illallangi.alfa.recorder import Recorder
+
+from loguru import logger
+
+TEMPLATE = """\
+apiVersion: v1
+kind: ConfigMap
+data:
+  instance: '{{ instance }}'
+  serial: '{{ spec.serial }}'
+"""
+
+
+async def run(
+    parents,
+    namespaces,
+    duration,
+    parent_rate,
+    event_rate,
+    latency,
+    error_rate,
+    schedule,
+    record=None,
+    dump=None,
+    dump_policy="drop",
+    dump_backend="files",
+    dump_max_size=None,
+    discovery=True,
+):
+    fake = FakeKubernetes(latency=latency, error_rate=error_rate)
+    fake.load(
+        {
+            "AlfaTemplate": [alfa_template(template=TEMPLATE)],
+            **generate(parents, namespaces),
+        }
+    )
+    url = await fake.start()
+    controller = Controller(
+        # The real client discovers the kinds from the fake server
+        url if discovery else FakeAPI(url),
+        (
+            None
+            if dump is None
+            else DumpWriter(
+                dump,
+                policy=dump_policy,
+                backend=(
+                    BlobBackend(dump, max_size=dump_max_size)
+                    if dump_backend == "blobs"
+                    else None
+                ),
+            )
+        ),
+        "Secret",
+        schedule=schedule,
+        recorder=None if record is None else Recorder(record),
+    )
+    task = get_event_loop().create_task(controller.loop())
+
+    started = monotonic()
+    while len(fake.objects["ConfigMap"]) < parents:
+        await sleep(0.1)
+    print(f"created {parents} children in {monotonic() - started:.2f} seconds")
+
+    if event_rate:
+        churn = get_event_loop().create_task(
+            fake.churn("Endpoints", event_rate, lambda i: i)
+        )
+    changed = {}
+    writes = len(fake.writes)
+    requests = fake.requests
+    deadline = monotonic() + duration
+    serial = 0
+    while monotonic() < deadline:
+        await sleep(fake.random.expovariate(parent_rate))
+        serial += 1
+        key = fake.random.choice(list(fake.objects["Secret"]))
+        parent = fake.objects["Secret"][key]
+        parent["spec"] = {**parent.get("spec", {}), "serial": serial}
+        fake.store("Secret", key[0], parent)
+        changed[
+            (parent["metadata"]["labels"]["app.kubernetes.io/instance"], str(serial))
+        ] = monotonic()
+    # Let the last changes settle
+    await sleep(schedule["max_latency"] + schedule["min_interval"] + 1)
+    if event_rate:
+        churn.cancel()
+
+    applied = {}
+    for at, kind, _, item in fake.writes[writes:]:
+        key = (
+            (item["data"]["instance"], item["data"]["serial"])
+            if kind == "ConfigMap"
+            else None
+        )
+        if key in changed and key not in applied:
+            applied[key] = at - changed[key]
+    latencies = sorted(applied.values())
+    print(
+        f"{len(changed)} parent changes, {len(latencies)} applied, "
+        f"{sum(1 for w in fake.writes[writes:] if w[1] == 'ConfigMap')} child writes, "
+        f"{fake.requests - requests} API requests"
+    )
+    if latencies:
+        p50, p95 = [latencies[int(q * (len(latencies) - 1))] for q in [0.5, 0.95]]
+        print(
+            f"event to apply: p50 {p50:.3f}s, p95 {p95:.3f}s, max {latencies[-1]:.3f}s"
+        )
+
+    task.cancel()
+    if controller.recorder is not None:
+        controller.recorder.close()
+    if controller.dump is not None:
+        controller.dump.close()
+        print(f"dumped {controller.dump.written}, dropped {controller.dump.dropped}")
+    await controller.session.close()
+    await fake.stop()
+
+
+@command()
+@option("--parents", type=INT, default=1000, show_default=True)
+@option("--namespaces", type=INT, default=10, show_default=True)
+@option("--duration", type=FLOAT, default=30.0, show_default=True)
+@option("--parent-rate", type=FLOAT, default=2.0, show_default=True)
+@option("--event-rate", type=FLOAT, default=0.0, show_default=True)
+@option("--latency", type=FLOAT, default=0.0, show_default=True)
+@option("--error-rate", type=FLOAT, default=0.0, show_default=True)
+@option("--debounce", type=FLOAT, default=1.0, show_default=True)
+@option("--max-latency", type=FLOAT, default=10.0, show_default=True)
+@option("--min-interval", type=FLOAT, default=5.0, show_default=True)
+@option("--record", default=None, type=PATH(dir_okay=False, writable=True))
+@option("--dump", default=None, type=PATH(file_okay=False, writable=True))
+@option("--dump-policy", type=CHOICE(POLICIES), default="drop", show_default=True)
+@option("--dump-backend", type=CHOICE(BACKENDS), default="files", show_default=True)
+@option("--dump-max-size", type=INT, default=None)
+@option("--discovery/--no-discovery", default=True, show_default=True)
+@option("--log-level", default="WARNING", show_default=True)
+def cli(
+    parents,
+    namespaces,
+    duration,
+    parent_rate,
+    event_rate,
+    latency,
+    error_rate,
+    debounce,
+    max_latency,
+    min_interval,
+    record,
+    dump,
+    dump_policy,
+    dump_backend,
+    dump_max_size,
+    discovery,
+    log_level,
+):
+    logger.remove()
+    logger.add(stderr, level=log_level)
+    get_event_loop().run_until_complete(
+        run(
+            parents,
+            namespaces,
+            duration,
+            parent_rate,
+            event_rate,
+            latency,
+            error_rate,
+            {
+                "debounce": debounce,
+                "max_latency": max_latency,
+                "min_interval": min_interval,
+            },
+            record,
+            dump,
+            dump_policy,
+            dump_backend,
+            dump_max_size,
+            discovery,
+        )
+    )
+
+
+if __name__ == "__main__":
+    cli()
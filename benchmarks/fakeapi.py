@@ -0,0 +1,394 @@
+import json
+from asyncio import Queue, TimeoutError, get_event_loop, sleep, wait_for
+from copy import deepcopy
+from random import Random
+from time import monotonic
+
+from aiohttp import web
+
+from click import FLOAT, INT, command, option
+
+from fixtures import KINDS, alfa_template, generate
+
+from loguru import logger
+
+HISTORY = 10000
+WATCH_TIMEOUT = 300
+
+
+class FakeKubernetes:
+    "an in-memory stand-in for the parts of the Kubernetes API that AlfaOperatr uses"
+
+    def __init__(
+        self,
+        kinds=KINDS,
+        latency=0.0,
+        error_rate=0.0,
+        history=HISTORY,
+        watch_timeout=WATCH_TIMEOUT,
+        seed=0,
+    ):
+        self.kinds = kinds
+        self.plurals = {
+            (group_version, plural): kind
+            for kind, (group_version, plural, _) in kinds.items()
+        }
+        self.latency = latency
+        self.error_rate = error_rate
+        self.history = history
+        self.watch_timeout = watch_timeout
+        self.random = Random(seed)
+        self.resource_version = 1
+        self.objects = {kind: {} for kind in kinds}
+        self.events = []
+        self.watchers = {kind: [] for kind in kinds}
+        self.writes = []
+        self.requests = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/api", self.api_versions)
+        app.router.add_get("/apis", self.api_groups)
+        app.router.add_get("/api/{version}", self.api_resources)
+        app.router.add_get("/apis/{group}/{version}", self.api_resources)
+        app.router.add_route("*", "/api/{version}/{path:.+}", self.handle)
+        app.router.add_route("*", "/apis/{group}/{version}/{path:.+}", self.handle)
+        return app
+
+    async def start(self, host="127.0.0.1", port=18080):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        # Open watches would otherwise hold up the shutdown until they time out
+        for queue in [q for queues in self.watchers.values() for q in queues]:
+            queue.put_nowait((None, None))
+        await self.runner.cleanup()
+
+    # Discovery
+
+    async def api_versions(self, request):
+        return respond({"kind": "APIVersions", "versions": ["v1"]})
+
+    async def api_groups(self, request):
+        groups = {
+            group_version.split("/")[0]: group_version
+            for group_version, _, _ in self.kinds.values()
+            if "/" in group_version
+        }
+        return respond(
+            {
+                "kind": "APIGroupList",
+                "apiVersion": "v1",
+                "groups": [
+                    {
+                        "name": name,
+                        "versions": [
+                            {
+                                "groupVersion": group_version,
+                                "version": group_version.split("/")[1],
+                            }
+                        ],
+                        "preferredVersion": {
+                            "groupVersion": group_version,
+                            "version": group_version.split("/")[1],
+                        },
+                    }
+                    for name, group_version in groups.items()
+                ],
+            }
+        )
+
+    async def api_resources(self, request):
+        group_version = "/".join(
+            p
+            for p in [request.match_info.get("group"), request.match_info["version"]]
+            if p
+        )
+        return respond(
+            {
+                "kind": "APIResourceList",
+                "apiVersion": "v1",
+                "groupVersion": group_version,
+                "resources": [
+                    {
+                        "name": plural,
+                        "singularName": kind.lower(),
+                        "namespaced": namespaced,
+                        "kind": kind,
+                        "verbs": ["create", "get", "list", "update", "watch"],
+                    }
+                    for kind, (gv, plural, namespaced) in self.kinds.items()
+                    if gv == group_version
+                ],
+            }
+        )
+
+    # Objects
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.latency:
+            await sleep(self.random.uniform(0, 2 * self.latency))
+        group_version = "/".join(
+            p
+            for p in [request.match_info.get("group"), request.match_info["version"]]
+            if p
+        )
+        path = request.match_info["path"].split("/")
+        namespace = None
+        if path[0] == "namespaces" and len(path) > 2:
+            namespace, path = path[1], path[2:]
+        kind = self.plurals.get((group_version, path[0]))
+        if kind is None or len(path) > 2:
+            return status(404, "NotFound", f"{request.path} not found")
+        name = path[1] if len(path) > 1 else None
+        if request.method != "GET" and self.random.random() < self.error_rate:
+            return status(500, "InternalError", "injected error")
+        if request.method == "GET" and name is None:
+            if request.query.get("watch") in ["1", "true"]:
+                return await self.watch(request, kind, namespace)
+            return self.list(request, kind, namespace)
+        if request.method == "GET":
+            item = self.objects[kind].get((namespace, name))
+            if item is None:
+                return status(404, "NotFound", f"{kind} {name} not found")
+            return respond(item)
+        if request.method == "POST" and name is None:
+            return self.create(kind, namespace, await request.json())
+        if request.method == "PUT" and name is not None:
+            return self.update(kind, namespace, name, await request.json())
+        return status(405, "MethodNotAllowed", f"{request.method} not allowed")
+
+    def list(self, request, kind, namespace):
+        items = sorted(
+            (
+                i
+                for (n, _), i in self.objects[kind].items()
+                if namespace is None or n == namespace
+            ),
+            key=lambda i: (i["metadata"].get("namespace", ""), i["metadata"]["name"]),
+        )
+        items = [i for i in items if selected(i, request.query.get("labelSelector"))]
+        resource_version = self.resource_version
+        offset = 0
+        if "continue" in request.query:
+            resource_version, offset = map(int, request.query["continue"].split(":"))
+            if resource_version < self.oldest:
+                return status(410, "Expired", "continue token has expired")
+        limit = int(request.query.get("limit", 0)) or len(items)
+        page = items[offset:][:limit]
+        metadata = {"resourceVersion": str(resource_version)}
+        if offset + limit < len(items):
+            metadata["continue"] = f"{resource_version}:{offset + limit}"
+        return respond(
+            {
+                "kind": f"{kind}List",
+                "apiVersion": self.kinds[kind][0],
+                "metadata": metadata,
+                "items": [
+                    {k: v for k, v in i.items() if k not in ["kind", "apiVersion"]}
+                    for i in page
+                ],
+            }
+        )
+
+    async def watch(self, request, kind, namespace):
+        selector = request.query.get("labelSelector")
+        since = int(request.query.get("resourceVersion", 0))
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        queue = Queue()
+        self.watchers[kind].append(queue)
+        try:
+            if since and since < self.oldest:
+                await write(
+                    response,
+                    "ERROR",
+                    {
+                        "kind": "Status",
+                        "status": "Failure",
+                        "code": 410,
+                        "reason": "Expired",
+                    },
+                )
+                return response
+            if since:
+                backlog = [
+                    (t, i) for v, k, t, i in self.events if k == kind and v > since
+                ]
+            else:
+                backlog = [("ADDED", i) for i in self.objects[kind].values()]
+            for event_type, item in backlog:
+                queue.put_nowait((event_type, item))
+            deadline = monotonic() + self.watch_timeout
+            while True:
+                try:
+                    event_type, item = await wait_for(
+                        queue.get(), max(deadline - monotonic(), 0)
+                    )
+                except TimeoutError:
+                    return response
+                if event_type is None:
+                    return response
+                if (
+                    namespace is None or item["metadata"].get("namespace") == namespace
+                ) and selected(item, selector):
+                    await write(response, event_type, item)
+        finally:
+            self.watchers[kind].remove(queue)
+
+    def create(self, kind, namespace, item):
+        name = item.get("metadata", {}).get("name")
+        if (namespace, name) in self.objects[kind]:
+            return status(409, "AlreadyExists", f"{kind} {name} already exists")
+        if item.get("metadata", {}).get("resourceVersion"):
+            return status(400, "BadRequest", "resourceVersion should not be set")
+        item = self.store(kind, namespace, item, "ADDED")
+        return respond(item, status=201)
+
+    def update(self, kind, namespace, name, item):
+        current = self.objects[kind].get((namespace, name))
+        if current is None:
+            return status(404, "NotFound", f"{kind} {name} not found")
+        resource_version = item.get("metadata", {}).get("resourceVersion")
+        if (
+            resource_version
+            and resource_version != current["metadata"]["resourceVersion"]
+        ):
+            return status(409, "Conflict", f"{kind} {name} has been modified")
+        item = deepcopy(item)
+        item["metadata"] = {
+            **item.get("metadata", {}),
+            "uid": current["metadata"]["uid"],
+            "resourceVersion": current["metadata"]["resourceVersion"],
+        }
+        if item == current:
+            return respond(current)
+        return respond(self.store(kind, namespace, item, "MODIFIED"))
+
+    def store(self, kind, namespace, item, event_type="MODIFIED"):
+        "saves item as the next resourceVersion and notifies watchers"
+        self.resource_version += 1
+        item = deepcopy(item)
+        item["kind"] = kind
+        item["apiVersion"] = self.kinds[kind][0]
+        item["metadata"] = {
+            **item.get("metadata", {}),
+            "resourceVersion": str(self.resource_version),
+        }
+        item["metadata"].setdefault(
+            "uid", f'{kind}-{namespace}-{item["metadata"]["name"]}'
+        )
+        if namespace is not None:
+            item["metadata"]["namespace"] = namespace
+        self.objects[kind][(namespace, item["metadata"]["name"])] = item
+        self.publish(kind, event_type, item)
+        return item
+
+    def delete(self, kind, namespace, name):
+        "removes an object and notifies watchers"
+        item = self.objects[kind].pop((namespace, name), None)
+        if item is not None:
+            self.resource_version += 1
+            item = {
+                **item,
+                "metadata": {
+                    **item["metadata"],
+                    "resourceVersion": str(self.resource_version),
+                },
+            }
+            self.publish(kind, "DELETED", item)
+        return item
+
+    def publish(self, kind, event_type, item):
+        self.events.append((self.resource_version, kind, event_type, item))
+        del self.events[: -self.history]
+        self.writes.append((monotonic(), kind, event_type, item))
+        for queue in self.watchers[kind]:
+            queue.put_nowait((event_type, item))
+
+    @property
+    def oldest(self):
+        "the oldest resourceVersion a watch or continue token can resume from"
+        return self.events[0][0] - 1 if len(self.events) >= self.history else 0
+
+    def load(self, items):
+        "stores each item of each kind, as a starting state"
+        for kind, values in items.items():
+            for item in values:
+                self.store(kind, item["metadata"].get("namespace"), item, "ADDED")
+
+    async def churn(self, kind, rate, mutate):
+        "modifies a random object of kind rate times a second until cancelled"
+        while True:
+            await sleep(self.random.expovariate(rate))
+            keys = list(self.objects[kind])
+            if keys:
+                key = self.random.choice(keys)
+                self.store(kind, key[0], mutate(deepcopy(self.objects[kind][key])))
+
+
+def selected(item, selector):
+    "whether item matches an equality-based label selector"
+    if not selector:
+        return True
+    labels = item.get("metadata", {}).get("labels") or {}
+    return all(
+        labels.get(key) == value
+        for key, _, value in (term.partition("=") for term in selector.split(","))
+    )
+
+
+def respond(data, status=200):
+    # The consumer expects a bare application/json content type, without charset
+    return web.Response(
+        body=json.dumps(data).encode("utf-8"),
+        status=status,
+        content_type="application/json",
+    )
+
+
+def status(code, reason, message):
+    return respond(
+        {
+            "kind": "Status",
+            "apiVersion": "v1",
+            "status": "Failure",
+            "code": code,
+            "reason": reason,
+            "message": message,
+        },
+        status=code,
+    )
+
+
+async def write(response, event_type, item):
+    await response.write(
+        json.dumps({"type": event_type, "object": item}).encode("utf-8") + b"\n"
+    )
+
+
+@command()
+@option("--port", type=INT, default=18080, show_default=True)
+@option("--parents", type=INT, default=1000, show_default=True)
+@option("--namespaces", type=INT, default=10, show_default=True)
+@option("--latency", type=FLOAT, default=0.0, show_default=True)
+@option("--error-rate", type=FLOAT, default=0.0, show_default=True)
+@option("--event-rate", type=FLOAT, default=0.0, show_default=True)
+def cli(port, parents, namespaces, latency, error_rate, event_rate):
+    fake = FakeKubernetes(latency=latency, error_rate=error_rate)
+    fake.load({"AlfaTemplate": [alfa_template()], **generate(parents, namespaces)})
+    loop = get_event_loop()
+    logger.info(
+        f"serving {parents} parents on {loop.run_until_complete(fake.start(port=port))}"
+    )
+    if event_rate:
+        loop.create_task(fake.churn("Endpoints", event_rate, lambda i: i))
+    loop.run_forever()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,84 @@
+import tracemalloc
+from timeit import timeit
+
+from click import INT, command, option
+
+from fixtures import LABELS, generate
+
+from illallangi.alfa.functions import common, merge, unique_dict
+from illallangi.alfa.jinja import (
+    AlfaJinja,
+    alfa_query,
+    json_query,
+    json_query_one,
+    json_query_unique,
+    query_cache_info,
+)
+
+
+def cases(items, lookups):
+    "returns a callable per filter, each making lookups calls as a template would"
+    secrets = items["Secret"]
+    services = items["Service"]
+    jinja = AlfaJinja("benchmark")
+    # Indexed as a render pass indexes its inputs
+    jinja.clear_indexes([services])
+    environment = jinja.environment
+    many_by_labels = environment.filters["many_by_labels"]
+    targets = [
+        (s["metadata"]["namespace"], s["metadata"]["labels"][LABELS["instance"]])
+        for s in secrets[:lookups]
+    ]
+    return {
+        "alfa_query": lambda: alfa_query(secrets, "Secret", "ConfigMap", "", "v1"),
+        "json_query": lambda: [
+            json_query(services, f"[?metadata.namespace=='{n}'].metadata.name")
+            for n, _ in targets
+        ],
+        "json_query_one": lambda: [
+            json_query_one(secrets, f"[?metadata.name=='{s['metadata']['name']}']")
+            for s in secrets[:lookups]
+        ],
+        "json_query_unique": lambda: json_query_unique(services, "[].spec"),
+        "many_by_labels": lambda: [
+            many_by_labels(environment, services, n, {LABELS["instance"]: i})
+            for n, i in targets
+        ],
+        "unique_dict": lambda: unique_dict(services + services),
+        "merge": lambda: [merge(a, b) for a, b in zip(secrets, services)],
+        "common": lambda: [common(a, b) for a, b in zip(secrets, services)],
+    }
+
+
+@command()
+@option(
+    "--parents",
+    type=INT,
+    multiple=True,
+    default=[100, 1000, 10000],
+    show_default=True,
+)
+@option("--namespaces", type=INT, default=10, show_default=True)
+@option("--lookups", type=INT, default=100, show_default=True)
+@option("--repeat", type=INT, default=3, show_default=True)
+def cli(parents, namespaces, lookups, repeat):
+    print(f'{"parents":>8} {"filter":<18} {"ms":>10} {"peak MiB":>9}')
+    for count in parents:
+        items = generate(count, namespaces)
+        for name, case in cases(items, lookups).items():
+            seconds = timeit(case, number=repeat) / repeat
+            tracemalloc.start()
+            case()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f"{count:>8} {name:<18} {seconds * 1000:>10.2f} {peak / 2 ** 20:>9.2f}"
+            )
+        info = query_cache_info()
+        print(
+            f'{count:>8} {"query cache":<18} {info.hits} hits, {info.misses} misses, {info.currsize} cached'
+        )
+
+
+if __name__ == "__main__":
+    cli()
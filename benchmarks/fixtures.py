@@ -0,0 +1,164 @@
+from random import Random
+from types import SimpleNamespace
+
+from illallangi.alfa.cache import Cache
+from illallangi.k8sapi import API as K8S_API
+
+from yarl import URL
+
+LABELS = {
+    "name": "app.kubernetes.io/name",
+    "partOf": "app.kubernetes.io/part-of",
+    "instance": "app.kubernetes.io/instance",
+    "domainName": "app.kubernetes.io/domain-name",
+    "component": "app.kubernetes.io/component",
+    "managedBy": "app.kubernetes.io/managed-by",
+}
+
+# kind: (group version, plural, namespaced)
+KINDS = {
+    "AlfaTemplate": ("controllers.illallangi.enterprises/v1", "alfatemplates", False),
+    "ConfigMap": ("v1", "configmaps", True),
+    "Endpoints": ("v1", "endpoints", True),
+    "Secret": ("v1", "secrets", True),
+    "Service": ("v1", "services", True),
+}
+
+TEMPLATE = """\
+apiVersion: v1
+kind: ConfigMap
+data:
+  instance: '{{ instance }}'
+  services: '{{ Service | many_by_labels(namespace, {labels_instance: instance}) | length }}'
+  addresses: '{{ Endpoints | many_by_labels(namespace, {labels_instance: instance}) | json_query("[].subsets[].addresses[].ip") | join(",") }}'
+"""
+
+
+class FakeKind:
+    "the parts of an illallangi.k8sapi kind that AlfaOperatr uses"
+
+    def __init__(self, url, kind, group_version, plural, namespaced):
+        self.kind = kind
+        self.plural = plural
+        self.namespaced = namespaced
+        self.api_group = SimpleNamespace(group_version=group_version)
+        self.base = URL(url) / ("apis" if "/" in group_version else "api")
+        self.base = self.base / group_version
+        self.rest_path = self.base / plural
+
+    def calculate_url(self, namespace=None, name=None):
+        url = self.base
+        if self.namespaced and namespace:
+            url = url / "namespaces" / namespace
+        url = url / self.plural
+        if name:
+            url = url / name
+        return str(url)
+
+
+class FakeAPI(K8S_API):
+    "an API that knows a fixed set of kinds instead of discovering them"
+
+    def __init__(self, url="http://localhost:8001", kinds=KINDS):
+        self.url = URL(url)
+        self.fake_kinds = {
+            kind: FakeKind(self.url, kind, *definition)
+            for kind, definition in kinds.items()
+        }
+
+    @property
+    def kinds(self):
+        return self.fake_kinds
+
+
+def alfa_template(
+    scope="Object",
+    parent="Secret",
+    child="ConfigMap",
+    monitored=("Service", "Endpoints"),
+    template=TEMPLATE,
+    name="benchmark",
+    **spec,
+):
+    return {
+        "apiVersion": "controllers.illallangi.enterprises/v1",
+        "kind": "AlfaTemplate",
+        "metadata": {"name": name, "resourceVersion": "1", "uid": f"{name}-uid"},
+        "spec": {
+            "scope": scope,
+            "kinds": {
+                "parent": {"kind": parent},
+                "child": {"kind": child},
+                "monitored": [{"kind": kind} for kind in monitored],
+            },
+            "template": template,
+            "ownerReferences": True,
+            "update": True,
+            "component": "benchmark",
+            "labels": LABELS,
+            **spec,
+        },
+    }
+
+
+def item(kind, i, namespace, labels, **fields):
+    group_version, _, _ = KINDS[kind]
+    return {
+        "apiVersion": group_version,
+        "kind": kind,
+        "metadata": {
+            "name": f"{kind.lower()}-{i}",
+            "namespace": namespace,
+            "uid": f"{kind.lower()}-{i}-uid",
+            "resourceVersion": str(1000 + i),
+            "labels": labels,
+        },
+        **fields,
+    }
+
+
+def generate(parents=100, namespaces=10, domains=20, monitored=2, seed=0):
+    "returns synthetic parents and monitored objects, by kind"
+    random = Random(seed)
+    result = {"Secret": [], "Service": [], "Endpoints": []}
+    for i in range(parents):
+        namespace = f"namespace-{random.randrange(namespaces)}"
+        domain = f"domain-{random.randrange(domains)}.example.com"
+        labels = {
+            LABELS["name"]: f"name-{i % 7}",
+            LABELS["instance"]: f"instance-{i}",
+            LABELS["domainName"]: domain,
+        }
+        result["Secret"].append(
+            item("Secret", i, namespace, labels, spec={"domainName": domain})
+        )
+        for j in range(monitored):
+            result["Service"].append(
+                item(
+                    "Service",
+                    i * monitored + j,
+                    namespace,
+                    dict(labels),
+                    spec={"ports": [{"name": "http", "port": 80 + j}]},
+                )
+            )
+            result["Endpoints"].append(
+                item(
+                    "Endpoints",
+                    i * monitored + j,
+                    namespace,
+                    dict(labels),
+                    subsets=[{"addresses": [{"ip": f"10.0.{j}.{i % 250}"}]}],
+                )
+            )
+    return result
+
+
+def caches(template, items, resource_version=2000):
+    "returns synced caches holding template and items, as the watches would"
+    result = {"AlfaTemplate": Cache("AlfaTemplate")}
+    result["AlfaTemplate"].replace([template], resource_version)
+    for kind, values in items.items():
+        result[kind] = Cache(kind)
+        result[kind].replace(values, resource_version)
+    return result
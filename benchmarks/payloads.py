@@ -0,0 +1,79 @@
+from asyncio import get_event_loop
+from time import process_time
+
+from aiohttp import ClientSession
+
+from click import INT, command, option
+
+from fakeapi import FakeKubernetes
+
+from fixtures import FakeAPI, alfa_template
+
+from illallangi.alfa.template import Consumer
+
+from loguru import logger
+
+
+def render(i, serial, size):
+    return {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {"name": f"configmap-{i}", "namespace": f"namespace-{i % 10}"},
+        "data": {f"key-{k}": f"value-{k}-{serial}" for k in range(size)},
+    }
+
+
+def resolve(message):
+    "a sink that builds every payload, as one that used them would"
+    for f in message.record["extra"].get("files", []):
+        f["yaml"]() if callable(f["yaml"]) else f["yaml"]
+
+
+async def run(objects, size, rounds, level):
+    fake = FakeKubernetes()
+    url = await fake.start()
+    async with ClientSession() as session:
+        consumer = Consumer(FakeAPI(url), None, alfa_template(), session=session)
+        logger.remove()
+        # eager is what every level paid before payloads were built lazily
+        logger.add(
+            resolve if level == "eager" else lambda m: None,
+            level="TRACE" if level == "eager" else level,
+        )
+        seconds = {}
+        for serial in range(rounds + 1):
+            started = process_time()
+            for i in range(objects):
+                await consumer.apply(render(i, serial, size))
+            seconds["create" if serial == 0 else f"update-{serial}"] = (
+                process_time() - started
+            )
+    await fake.stop()
+    return seconds["create"], sum(v for k, v in seconds.items() if k != "create") / max(
+        rounds, 1
+    )
+
+
+@command()
+@option("--objects", type=INT, default=500, show_default=True)
+@option("--size", type=INT, multiple=True, default=[10, 100], show_default=True)
+@option("--rounds", type=INT, default=3, show_default=True)
+def cli(objects, size, rounds):
+    print(f'{"keys":>6} {"level":<8} {"create µs/obj":>14} {"update µs/obj":>14}')
+    for keys in size:
+        results = {}
+        for level in ["eager", "DEBUG", "INFO"]:
+            results[level] = get_event_loop().run_until_complete(
+                run(objects, keys, rounds, level)
+            )
+            create, update = results[level]
+            print(
+                f"{keys:>6} {level:<8} {create / objects * 1e6:>14.0f} {update / objects * 1e6:>14.0f}"
+            )
+        print(
+            f'{keys:>6} {"saved":<8} {(results["eager"][0] - results["INFO"][0]) / objects * 1e6:>14.0f} {(results["eager"][1] - results["INFO"][1]) / objects * 1e6:>14.0f}'
+        )
+
+
+if __name__ == "__main__":
+    cli()
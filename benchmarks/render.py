@@ -0,0 +1,95 @@
+import tracemalloc
+from asyncio import get_event_loop
+from time import perf_counter
+
+from aiohttp import ClientSession
+
+from click import Choice as CHOICE, INT, command, option
+
+from fixtures import FakeAPI, alfa_template, caches, generate
+
+from illallangi.alfa.template.renderer import Renderer
+
+from loguru import logger
+
+STAGES = ["items", "objects", "domains", "namespaces", "clusters", "renders"]
+
+
+async def run(scope, items, memory):
+    "renders once, returning each stage's seconds and peak bytes"
+    template = alfa_template(scope=scope)
+    session = ClientSession()
+    renderer = Renderer(
+        api=FakeAPI(),
+        dump=None,
+        name=template["metadata"]["name"],
+        session=session,
+        caches=caches(template, items),
+    )
+    # Settings and template are resolved up front so they are not charged
+    # to the first stage
+    await renderer.settings
+    result = {}
+    try:
+        for stage in STAGES:
+            if memory:
+                if hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+                else:
+                    # Before Python 3.9, clearing the traces is the only way to
+                    # reset the peak
+                    tracemalloc.clear_traces()
+                before = tracemalloc.get_traced_memory()[0]
+            started = perf_counter()
+            await getattr(renderer, stage)
+            result[stage] = (
+                perf_counter() - started,
+                tracemalloc.get_traced_memory()[1] - before if memory else None,
+            )
+    finally:
+        await session.close()
+    return result
+
+
+@command()
+@option(
+    "--parents",
+    type=INT,
+    multiple=True,
+    default=[100, 1000, 10000],
+    show_default=True,
+)
+@option("--namespaces", type=INT, default=10, show_default=True)
+@option("--domains", type=INT, default=20, show_default=True)
+@option("--monitored", type=INT, default=2, show_default=True)
+@option(
+    "--scope",
+    type=CHOICE(["Object", "Domain", "Namespace", "Cluster"]),
+    multiple=True,
+    default=["Object", "Domain", "Namespace", "Cluster"],
+    show_default=True,
+)
+@option("--repeat", type=INT, default=3, show_default=True)
+def cli(parents, namespaces, domains, monitored, scope, repeat):
+    logger.remove()
+    loop = get_event_loop()
+    print(f'{"parents":>8} {"scope":<10} {"stage":<11} {"ms":>10} {"peak MiB":>9}')
+    for count in parents:
+        items = generate(count, namespaces, domains, monitored)
+        for s in scope:
+            timings = [
+                loop.run_until_complete(run(s, items, False)) for _ in range(repeat)
+            ]
+            tracemalloc.start()
+            memory = loop.run_until_complete(run(s, items, True))
+            tracemalloc.stop()
+            for stage in STAGES:
+                print(
+                    f"{count:>8} {s:<10} {stage:<11}"
+                    f" {min(t[stage][0] for t in timings) * 1000:>10.2f}"
+                    f" {memory[stage][1] / 2 ** 20:>9.2f}"
+                )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,187 @@
+import resource
+from asyncio import get_event_loop, sleep
+from itertools import groupby
+from json import loads
+from sys import stderr
+from time import monotonic
+
+from click import FLOAT, Path as PATH, STRING, command, option
+
+from fakeapi import FakeKubernetes
+
+from fixtures import FakeAPI, KINDS
+
+from illallangi.alfa.cluster import Controller
+from illallangi.alfa.recorder import read
+
+from loguru import logger
+
+from prometheus_client import REGISTRY
+
+
+def kinds(records):
+    "returns the group version, plural and scope of each recorded kind"
+    result = {}
+    for record in records:
+        parts = record["path"].strip("/").split("/")
+        objects = record.get("items") or []
+        if "line" in record:
+            objects = [loads(record["line"]).get("object", {})]
+        result.setdefault(
+            record["kind"],
+            ["/".join(parts[1:-1]), parts[-1], False],
+        )
+        result[record["kind"]][2] |= any(
+            o.get("metadata", {}).get("namespace") for o in objects
+        )
+    return {kind: tuple(value) for kind, value in result.items()}
+
+
+def seed(records):
+    "returns the first listed state of each kind"
+    result = {}
+    for record in records:
+        if "items" in record and record["kind"] not in result:
+            result[record["kind"]] = record["items"]
+    return result
+
+
+def sample(name, **labels):
+    return sum(
+        s.value
+        for metric in REGISTRY.collect()
+        for s in metric.samples
+        if s.name == name and all(s.labels.get(k) == v for k, v in labels.items())
+    )
+
+
+async def quiesce(fake, quiet):
+    "waits until nothing has been written for quiet seconds"
+    while True:
+        last = fake.writes[-1][0] if fake.writes else 0
+        if monotonic() - last >= quiet:
+            return
+        await sleep(quiet / 10)
+
+
+async def run(recording, parent, speed, quiet, schedule, extra_kinds):
+    records = list(read(recording))
+    # Child kinds are only recorded when watched, so they come from the
+    # command line or the fixtures
+    fake = FakeKubernetes(kinds={**KINDS, **extra_kinds, **kinds(records)})
+    for kind, items in seed(records).items():
+        for item in items:
+            fake.store(kind, item["metadata"].get("namespace"), item, "ADDED")
+    url = await fake.start()
+    controller = Controller(
+        FakeAPI(url, kinds=fake.kinds), None, parent, schedule=schedule
+    )
+    task = get_event_loop().create_task(controller.loop())
+
+    await sleep(quiet)
+    await quiesce(fake, quiet)
+    renders = sample("alfa_render_stage_duration_seconds_count", stage="renders")
+    writes = len(fake.writes)
+    requests = fake.requests
+    events = [
+        (record["time"], record["kind"], loads(record["line"]))
+        for record in records
+        if "line" in record
+    ]
+    print(f"replaying {len(events)} events at {speed or 'maximum'}x speed")
+
+    started = monotonic()
+    for recorded, kind, event in events:
+        if speed:
+            await sleep(
+                max((recorded - events[0][0]) / speed - (monotonic() - started), 0)
+            )
+        else:
+            await sleep(0)
+        item = event.get("object", {})
+        metadata = item.get("metadata", {})
+        if event["type"] in ["ADDED", "MODIFIED"]:
+            fake.store(kind, metadata.get("namespace"), item, event["type"])
+        elif event["type"] == "DELETED":
+            fake.delete(kind, metadata.get("namespace"), metadata.get("name"))
+    replayed = monotonic() - started
+    await quiesce(fake, quiet)
+    settled = monotonic() - started - quiet
+
+    children = [w for w in fake.writes[writes:] if w[1] not in {e[1] for e in events}]
+    print(f"replayed in {replayed:.2f}s, settled after {settled:.2f}s")
+    print(
+        f'{sample("alfa_render_stage_duration_seconds_count", stage="renders") - renders:.0f} renders, '
+        f"{len(children)} child writes, {fake.requests - requests} API requests"
+    )
+    for kind, group in groupby(sorted(w[1] for w in children)):
+        print(f" - {kind}: {len(list(group))} writes")
+    print(
+        f"peak memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB"
+    )
+
+    task.cancel()
+    await controller.session.close()
+    await fake.stop()
+
+
+@command()
+@option(
+    "--recording",
+    required=True,
+    type=PATH(exists=True, file_okay=True, dir_okay=False, readable=True),
+)
+@option("--parent", required=True, type=STRING)
+@option(
+    "--speed",
+    type=FLOAT,
+    default=1.0,
+    show_default=True,
+    help="Multiple of the recorded rate, or 0 for as fast as possible",
+)
+@option(
+    "--kind",
+    "extra_kinds",
+    multiple=True,
+    type=STRING,
+    help="An unrecorded namespaced kind, as Kind=group/version/plural",
+)
+@option("--quiet", type=FLOAT, default=5.0, show_default=True)
+@option("--debounce", type=FLOAT, default=1.0, show_default=True)
+@option("--max-latency", type=FLOAT, default=10.0, show_default=True)
+@option("--min-interval", type=FLOAT, default=5.0, show_default=True)
+@option("--log-level", default="WARNING", show_default=True)
+def cli(
+    recording,
+    parent,
+    speed,
+    extra_kinds,
+    quiet,
+    debounce,
+    max_latency,
+    min_interval,
+    log_level,
+):
+    logger.remove()
+    logger.add(stderr, level=log_level)
+    get_event_loop().run_until_complete(
+        run(
+            recording,
+            parent,
+            speed,
+            quiet,
+            {
+                "debounce": debounce,
+                "max_latency": max_latency,
+                "min_interval": min_interval,
+            },
+            {
+                kind: (path.rsplit("/", 1)[0], path.rsplit("/", 1)[1], True)
+                for kind, path in (k.split("=", 1) for k in extra_kinds)
+            },
+        )
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,62 @@
+from random import Random
+from timeit import timeit
+
+from click import INT, command, option
+
+from illallangi.alfa.functions import unique_dict
+
+import yaml
+
+
+def yaml_unique_dict(input):
+    "the YAML round-trip implementation unique_dict replaced"
+    return [yaml.load(y, Loader=yaml.FullLoader) for y in {yaml.dump(d) for d in input}]
+
+
+def generate(count, distinct, seed=0):
+    random = Random(seed)
+    population = [
+        {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {
+                "name": f"service-{i}",
+                "namespace": f"namespace-{i % 10}",
+                "labels": {
+                    "app.kubernetes.io/name": f"name-{i % 7}",
+                    "app.kubernetes.io/instance": f"instance-{i}",
+                },
+            },
+            "spec": {
+                "ports": [
+                    {"name": "http", "port": 80, "targetPort": 8080 + i % 3},
+                    {"name": "https", "port": 443, "targetPort": 8443},
+                ],
+                "selector": {"app.kubernetes.io/instance": f"instance-{i}"},
+            },
+        }
+        for i in range(distinct)
+    ]
+    return [random.choice(population) for _ in range(count)]
+
+
+@command()
+@option("--count", type=INT, default=5000, show_default=True)
+@option("--distinct", type=INT, default=500, show_default=True)
+@option("--repeat", type=INT, default=3, show_default=True)
+def cli(count, distinct, repeat):
+    input = generate(count, distinct)
+    if sorted(map(yaml.dump, unique_dict(input))) != sorted(
+        map(yaml.dump, yaml_unique_dict(input))
+    ):
+        raise Exception("unique_dict and yaml_unique_dict disagree")
+    yaml_time = timeit(lambda: yaml_unique_dict(input), number=repeat) / repeat
+    freeze_time = timeit(lambda: unique_dict(input), number=repeat) / repeat
+    print(f"{count} dicts, {distinct} distinct")
+    print(f"yaml round trip: {yaml_time * 1000:10.2f} ms")
+    print(f"unique_dict:     {freeze_time * 1000:10.2f} ms")
+    print(f"speedup:         {yaml_time / freeze_time:10.1f}x")
+
+
+if __name__ == "__main__":
+    cli()
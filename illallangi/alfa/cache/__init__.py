@@ -0,0 +1,98 @@
+from asyncio import Event, sleep
+
+from illallangi.alfa.functions import recursive_get
+
+from loguru import logger
+
+PAGE_LIMIT = 500
+LIST_RETRIES = 5
+LIST_BACKOFF = 1.0
+
+
+class Cache:
+    def __init__(self, kind):
+        self.kind = kind
+        self.items = {}
+        self.resource_version = 0
+        self.synced = Event()
+
+    @staticmethod
+    def key(item):
+        # A cluster-scoped object may carry an explicit null namespace
+        return f'{recursive_get(item, "metadata.namespace") or ""}/{recursive_get(item, "metadata.name")}'
+
+    def replace(self, items, resource_version):
+        self.items = {self.key(item): item for item in items}
+        self.resource_version = resource_version
+        self.synced.set()
+
+    def apply(self, event):
+        "applies a watch event, returning the previously cached object"
+        key = self.key(event["object"])
+        if event["type"] == "DELETED":
+            previous = self.items.pop(key, None)
+        else:
+            previous = self.items.get(key, None)
+            self.items[key] = event["object"]
+        self.resource_version = max(
+            self.resource_version,
+            int(recursive_get(event["object"], "metadata.resourceVersion", default=0)),
+        )
+        return previous
+
+    def store(self, item):
+        "caches the response to our own write until its watch event arrives"
+        key = self.key(item)
+        current = self.items.get(key)
+        if current is None or int(
+            recursive_get(current, "metadata.resourceVersion", default=0)
+        ) < int(recursive_get(item, "metadata.resourceVersion", default=0)):
+            self.items[key] = item
+
+    def values(self):
+        return list(self.items.values())
+
+
+async def list_items(session, api, kind, limit=PAGE_LIMIT, label_selector=None):
+    items = []
+    expired = 0
+    params = {"limit": limit}
+    if label_selector is not None:
+        params["labelSelector"] = label_selector
+    while True:
+        async with session.request(
+            "get", api.kinds[kind].rest_path.with_query(params)
+        ) as item_collection_response:
+            item_collection = await item_collection_response.json()
+        if (
+            item_collection.get("kind") == "Status"
+            and item_collection.get("reason") == "Expired"
+        ):
+            expired += 1
+            if expired > LIST_RETRIES:
+                raise Exception(f"{kind} list expired {expired} times")
+            items = []
+            params.pop("continue", None)
+            # Without a limit there are no continue tokens left to expire
+            if expired >= LIST_RETRIES:
+                logger.warning(f"{kind} list expired {expired} times, listing unpaged")
+                params.pop("limit", None)
+                continue
+            delay = LIST_BACKOFF * 2 ** (expired - 1)
+            logger.warning(f"{kind} list expired, restarting list in {delay} seconds")
+            await sleep(delay)
+            continue
+        # Items in a list response omit kind and apiVersion
+        items.extend(
+            {
+                "kind": kind,
+                "apiVersion": item_collection["apiVersion"],
+                **item,
+            }
+            for item in item_collection["items"]
+        )
+        if not recursive_get(item_collection, "metadata.continue"):
+            return items, int(
+                recursive_get(item_collection, "metadata.resourceVersion", default=0)
+            )
+        params["continue"] = recursive_get(item_collection, "metadata.continue")
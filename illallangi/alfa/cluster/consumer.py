@@ -12,7 +12,20 @@ from yarl import URL
 
 
 class Consumer:
-    def __init__(self, api, dump, parent, session=None, queue=None):
+    def __init__(
+        self,
+        api,
+        dump,
+        parent,
+        session=None,
+        queue=None,
+        caches=None,
+        multiplexer=None,
+        jinja_cache=None,
+        semaphore=None,
+        retry_bucket=None,
+        schedule=None,
+    ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
             if not isinstance(api, K8S_API)
@@ -28,6 +41,12 @@ class Consumer:
         self.queue = Queue() if queue is None else queue
         if not isinstance(self.queue, Queue):
             raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.caches = {} if caches is None else caches
+        self.multiplexer = multiplexer
+        self.jinja_cache = jinja_cache
+        self.semaphore = semaphore
+        self.retry_bucket = retry_bucket
+        self.schedule = schedule
         self.controllers = {}
 
     async def loop(self):
@@ -37,7 +56,7 @@ class Consumer:
             await self.consume(queued["event"])
 
     async def consume(self, event):
-        logger.trace(f"Received event {dumps(event)}")
+        logger.opt(lazy=True).trace("Received event {}", lambda: dumps(event))
         if not self.parent == event["object"]["spec"]["kinds"]["parent"]["kind"]:
             logger.debug(
                 f'Ignoring {event["object"]["metadata"]["name"]} {event["type"].lower()} (resourceVersion {event["object"]["metadata"]["resourceVersion"]}) - Not a template for {self.parent}'
@@ -48,10 +67,9 @@ class Consumer:
             f'Processing {event["object"]["metadata"]["name"]} {event["type"].lower()} (resourceVersion {event["object"]["metadata"]["resourceVersion"]})'
         )
 
-        if event["object"]["metadata"]["name"] in self.controllers.keys():
-            logger.info(f'stopping {event["object"]["metadata"]["name"]} controller')
-            self.controllers.pop(event["object"]["metadata"]["name"]).cancel()
-            await sleep(0)
+        # The replacement controller subscribes to the shared watches before
+        # the previous controller releases them, so they are not torn down
+        previous = self.controllers.pop(event["object"]["metadata"]["name"], None)
 
         if event["type"].lower() == "added" or event["type"].lower() == "modified":
             logger.info(f'creating {event["object"]["metadata"]["name"]} controller')
@@ -60,6 +78,17 @@ class Consumer:
                 dump=self.dump,
                 alfa_template=event["object"],
                 session=self.session,
+                caches=self.caches,
+                multiplexer=self.multiplexer,
+                jinja_cache=self.jinja_cache,
+                semaphore=self.semaphore,
+                retry_bucket=self.retry_bucket,
+                schedule=self.schedule,
             )
             get_event_loop().create_task(controller.loop())
             self.controllers[event["object"]["metadata"]["name"]] = controller
+
+        if previous is not None:
+            logger.info(f'stopping {event["object"]["metadata"]["name"]} controller')
+            previous.cancel()
+            await sleep(0)
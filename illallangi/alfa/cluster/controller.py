@@ -1,7 +1,10 @@
-from asyncio import Queue, gather, get_event_loop
+from asyncio import Queue, Semaphore, gather, get_event_loop
 
 from aiohttp import ClientSession
 
+from illallangi.alfa.cache import Cache
+from illallangi.alfa.dump import DumpWriter
+from illallangi.alfa.template import Multiplexer, TokenBucket
 from illallangi.k8sapi import API as K8S_API
 
 from loguru import logger
@@ -11,16 +14,33 @@ from yarl import URL
 from .consumer import Consumer
 from .producer import Producer
 
+CONCURRENCY = 32
+
 
 class Controller:
-    def __init__(self, api, dump, parent, session=None, queue=None):
+    def __init__(
+        self,
+        api,
+        dump,
+        parent,
+        session=None,
+        queue=None,
+        jinja_cache=None,
+        concurrency=CONCURRENCY,
+        schedule=None,
+        recorder=None,
+    ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
             if not isinstance(api, K8S_API)
             else api
         )
-        self.dump = dump
+        self.dump = DumpWriter(dump) if isinstance(dump, str) else dump
         self.parent = parent
+        self.jinja_cache = jinja_cache
+        self.semaphore = Semaphore(concurrency)
+        self.retry_bucket = TokenBucket()
+        self.schedule = schedule
         self.session = ClientSession() if session is None else session
         if not isinstance(self.session, ClientSession):
             raise TypeError(
@@ -29,6 +49,11 @@ class Controller:
         self.queue = Queue() if queue is None else queue
         if not isinstance(self.queue, Queue):
             raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.caches = {"AlfaTemplate": Cache("AlfaTemplate")}
+        self.recorder = recorder
+        self.multiplexer = Multiplexer(
+            api=self.api, session=self.session, recorder=self.recorder
+        )
 
     async def loop(self):
         with logger.contextualize():
@@ -44,14 +69,24 @@ class Controller:
             parent=self.parent,
             session=self.session,
             queue=self.queue,
+            caches=self.caches,
+            multiplexer=self.multiplexer,
+            jinja_cache=self.jinja_cache,
+            semaphore=self.semaphore,
+            retry_bucket=self.retry_bucket,
+            schedule=self.schedule,
         ).loop()
 
+        yield self.multiplexer.loop()
+
         for kind in ["AlfaTemplate"]:
             yield Producer(
                 api=self.api,
                 kind=kind,
                 session=self.session,
                 queue=self.queue,
+                cache=self.caches[kind],
+                recorder=self.recorder,
             ).loop()
 
     def __del__(self):
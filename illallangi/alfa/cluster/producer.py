@@ -4,6 +4,8 @@ from asyncio.exceptions import TimeoutError
 
 from aiohttp import ClientSession
 
+from illallangi.alfa.cache import list_items
+from illallangi.alfa.metrics import WATCH_EVENTS, WATCH_RECONNECTS
 from illallangi.k8sapi import API as K8S_API
 
 from loguru import logger
@@ -20,6 +22,8 @@ class Producer:
         kind,
         session=None,
         queue=None,
+        cache=None,
+        recorder=None,
     ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
@@ -35,13 +39,21 @@ class Producer:
         self.queue = Queue() if queue is None else queue
         if not isinstance(self.queue, Queue):
             raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.cache = cache
+        self.recorder = recorder
 
     async def loop(self):
         with logger.contextualize():
             logger.debug("starting loop")
             resource_version = 0
+            reconnecting = False
             while True:
+                if reconnecting:
+                    WATCH_RECONNECTS.labels(self.kind).inc()
+                reconnecting = True
                 try:
+                    if self.cache is not None and resource_version == 0:
+                        resource_version = await self.list()
                     params = {"watch": 1}
                     if resource_version > 0:
                         params["resourceVersion"] = resource_version
@@ -53,6 +65,12 @@ class Producer:
                         logger.info(f"connected to {response.url}")
                         async for line in response.content:
                             if line:
+                                if self.recorder is not None:
+                                    self.recorder.watch(
+                                        self.kind,
+                                        self.api.kinds[self.kind].rest_path.path,
+                                        line,
+                                    )
                                 try:
                                     event = json.loads(line)
                                 except json.decoder.JSONDecodeError as e:
@@ -60,6 +78,7 @@ class Producer:
                                         f'JSONDecodeError "{repr(e)}" on "{line}", continuing.'
                                     )
                                     continue
+                                WATCH_EVENTS.labels(self.kind, event["type"]).inc()
                                 if (
                                     event["type"] == "ERROR"
                                     and event["object"]["reason"] == "Expired"
@@ -69,6 +88,8 @@ class Producer:
                                         f"connection expired, restarting at resourceVersion {resource_version}"
                                     )
                                     break
+                                if self.cache is not None and event["type"] != "ERROR":
+                                    self.cache.apply(event)
                                 await self.handle_event(event)
                                 if (
                                     int(event["object"]["metadata"]["resourceVersion"])
@@ -86,8 +107,22 @@ class Producer:
                     )
             logger.debug("completed loop")
 
+    async def list(self):
+        items, resource_version = await list_items(self.session, self.api, self.kind)
+        self.cache.replace(items, resource_version)
+        if self.recorder is not None:
+            self.recorder.list(
+                self.kind, self.api.kinds[self.kind].rest_path.path, items
+            )
+        logger.info(
+            f"listed {len(items)} {self.kind}(s) at resourceVersion {resource_version}"
+        )
+        for item in items:
+            await self.handle_event({"type": "ADDED", "object": item})
+        return resource_version
+
     async def handle_event(self, event):
-        logger.trace(f"{json.dumps(event)}")
+        logger.opt(lazy=True).trace("{}", lambda: json.dumps(event))
         if "name" not in event["object"]["metadata"].keys():
             logger.debug("ignoring event with no object.metadata.name")
             return
@@ -0,0 +1,118 @@
+import os
+from queue import Empty, Full, Queue
+from threading import Thread
+
+from loguru import logger
+
+from .blobs import BlobBackend  # noqa: F401
+
+QUEUE_SIZE = 1000
+BATCH_SIZE = 100
+POLICIES = ["drop", "block"]
+BACKENDS = ["files", "blobs"]
+
+
+class FileBackend:
+    "Writes each dump artefact to its own file"
+
+    def __init__(self, path):
+        self.path = path
+
+    def store(
+        self, filename, content, template=None, object=None, resource_version=None
+    ):
+        with open(
+            os.path.join(self.path, filename),
+            "wb" if isinstance(content, bytes) else "w",
+        ) as outfile:
+            outfile.write(content)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DumpWriter(Thread):
+    "Serializes and writes --dump artefacts on a background thread"
+
+    def __init__(
+        self,
+        path,
+        policy="drop",
+        queue_size=QUEUE_SIZE,
+        batch=BATCH_SIZE,
+        backend=None,
+    ):
+        super().__init__(daemon=True)
+        if policy not in POLICIES:
+            raise ValueError(f"Expected one of {POLICIES}; got {policy}")
+        self.path = path
+        self.backend = FileBackend(path) if backend is None else backend
+        self.policy = policy
+        self.batch = batch
+        self.queue = Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.start()
+
+    def write(
+        self, filename, content, template=None, object=None, resource_version=None
+    ):
+        "queues content, a string or bytes or a callable returning one, to be written to filename"
+        job = (filename, content, template, object, resource_version)
+        if self.policy == "block":
+            self.queue.put(job)
+            return True
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except Full:
+            self.dropped += 1
+            logger.warning(
+                f"dump queue full, dropped {filename} ({self.dropped} dropped)"
+            )
+            return False
+
+    def run(self):
+        while True:
+            jobs = [self.queue.get()]
+            while len(jobs) < self.batch and jobs[-1] is not None:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            for job in jobs:
+                if job is None:
+                    break
+                filename, content, template, object, resource_version = job
+                try:
+                    self.backend.store(
+                        filename,
+                        content() if callable(content) else content,
+                        template=template,
+                        object=object,
+                        resource_version=resource_version,
+                    )
+                    self.written += 1
+                except Exception as e:
+                    logger.error(f"error writing dump {filename}: {repr(e)}")
+            try:
+                self.backend.flush()
+            except Exception as e:
+                logger.error(f"error flushing dump: {repr(e)}")
+            if jobs[-1] is None:
+                self.backend.close()
+                return
+
+    def close(self):
+        "writes everything queued so far and stops the thread"
+        self.queue.put(None)
+        self.join()
+        logger.debug(f"dump writer wrote {self.written}, dropped {self.dropped}")
+
+
+def object_name(item):
+    "the namespace-name-kind prefix of an object's dump files"
+    return f'{item["metadata"].get("namespace","cluster")}-{item["metadata"]["name"]}-{item["kind"]}'
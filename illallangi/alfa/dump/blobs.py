@@ -0,0 +1,118 @@
+import gzip
+import os
+import sqlite3
+from hashlib import sha256
+from time import time
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER)",
+    "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, created REAL, filename TEXT, template TEXT, object TEXT, resource_version TEXT, digest TEXT)",
+    "CREATE INDEX IF NOT EXISTS entries_object ON entries (template, object, resource_version)",
+    "CREATE INDEX IF NOT EXISTS entries_filename ON entries (filename, digest)",
+    "CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)",
+    "CREATE INDEX IF NOT EXISTS entries_created ON entries (created)",
+]
+
+
+class BlobBackend:
+    "Stores dump artefacts as deduplicated gzip blobs with a sqlite index"
+
+    def __init__(self, path, max_size=None, max_age=None):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        os.makedirs(os.path.join(self.path, "blobs"), exist_ok=True)
+        # Written from the dump thread, read from wherever get is called
+        self.db = sqlite3.connect(
+            os.path.join(self.path, "index.sqlite"), check_same_thread=False
+        )
+        for statement in SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+
+    def store(
+        self, filename, content, template=None, object=None, resource_version=None
+    ):
+        data = content if isinstance(content, bytes) else content.encode("utf-8")
+        digest = sha256(data).hexdigest()
+        if not self.db.execute(
+            "SELECT 1 FROM blobs WHERE digest = ?", (digest,)
+        ).fetchone():
+            blob = self.blob(digest)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            with open(blob, "wb") as outfile:
+                outfile.write(gzip.compress(data))
+            self.db.execute(
+                "INSERT INTO blobs (digest, size) VALUES (?, ?)",
+                (digest, os.path.getsize(blob)),
+            )
+        # Rewriting identical content only refreshes the entry's age
+        if not self.db.execute(
+            "UPDATE entries SET created = ? WHERE filename = ? AND digest = ?",
+            (time(), filename, digest),
+        ).rowcount:
+            self.db.execute(
+                "INSERT INTO entries (created, filename, template, object, resource_version, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (time(), filename, template, object, resource_version, digest),
+            )
+
+    def flush(self):
+        "applies the retention limits and commits the index"
+        if self.max_age is not None:
+            for id, digest in self.db.execute(
+                "SELECT id, digest FROM entries WHERE created < ?",
+                (time() - self.max_age,),
+            ).fetchall():
+                self.remove(id, digest)
+        if self.max_size is not None:
+            size = self.size
+            if size > self.max_size:
+                for id, digest in self.db.execute(
+                    "SELECT id, digest FROM entries ORDER BY created"
+                ).fetchall():
+                    size -= self.remove(id, digest)
+                    if size <= self.max_size:
+                        break
+        self.db.commit()
+
+    def remove(self, id, digest):
+        "removes an entry, and its blob once unreferenced, returning the bytes freed"
+        self.db.execute("DELETE FROM entries WHERE id = ?", (id,))
+        if self.db.execute(
+            "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+        ).fetchone():
+            return 0
+        (size,) = self.db.execute(
+            "SELECT size FROM blobs WHERE digest = ?", (digest,)
+        ).fetchone()
+        self.db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        try:
+            os.remove(self.blob(digest))
+        except FileNotFoundError:
+            pass
+        return size
+
+    def get(self, filename):
+        "returns the newest content written to filename, or None"
+        row = self.db.execute(
+            "SELECT digest FROM entries WHERE filename = ? ORDER BY created DESC LIMIT 1",
+            (filename,),
+        ).fetchone()
+        if row is None:
+            return None
+        with open(self.blob(row[0]), "rb") as infile:
+            data = gzip.decompress(infile.read())
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return data
+
+    def blob(self, digest):
+        return os.path.join(self.path, "blobs", digest[:2], f"{digest}.gz")
+
+    @property
+    def size(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def close(self):
+        self.db.close()
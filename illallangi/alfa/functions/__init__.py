@@ -40,8 +40,61 @@ def common(a, b):
     return result
 
 
+def group_by(items, key):
+    "groups items into lists by key, preserving first-seen order"
+    result = {}
+    for item in items:
+        result.setdefault(key(item), []).append(item)
+    return result
+
+
+def freeze(value):
+    "returns a hashable, order-insensitive representation of nested dicts and lists"
+    if isinstance(value, dict):
+        return frozenset((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    # Keep 1, 1.0 and True distinct, as they were when compared as YAML
+    return (type(value), value)
+
+
 def unique_dict(input):
-    return [yaml.load(y, Loader=yaml.FullLoader) for y in {yaml.dump(d) for d in input}]
+    "returns input without structural duplicates, in first-seen order"
+    seen = set()
+    result = []
+    for d in input:
+        key = freeze(d)
+        if key not in seen:
+            seen.add(key)
+            result.append(d)
+    return result
+
+
+def unchanged(desired, live, previous=None):
+    "whether applying desired over live would leave live as it is"
+    # Fields absent from desired are server-populated or defaulted, unless
+    # previous, the desired state applied last, set them and live still has them
+    if desired is None:
+        return previous in [None, {}, []] or live in [None, {}, []]
+    if isinstance(desired, dict):
+        if not isinstance(live, dict):
+            return live is None and not desired
+        previous = previous if isinstance(previous, dict) else {}
+        return all(
+            unchanged(desired.get(k), live.get(k), previous.get(k))
+            for k in {*desired.keys(), *previous.keys()}
+        )
+    if isinstance(desired, list):
+        if not isinstance(live, list):
+            return live is None and not desired
+        previous = previous if isinstance(previous, list) else []
+        return len(desired) == len(live) and all(
+            unchanged(d, i, previous[n] if n < len(previous) else None)
+            for n, (d, i) in enumerate(zip(desired, live))
+        )
+    return desired == live
 
 
 # https://stackoverflow.com/a/28225747
@@ -53,6 +106,15 @@ def recursive_get(d, *keys, default=None, sep="."):
     return result
 
 
+def path_get(d, path, default=None):
+    "recursive_get for a precomputed tuple of keys"
+    for key in path:
+        d = d.get(key, {}) if isinstance(d, dict) else {}
+    if d == {}:
+        return default
+    return d
+
+
 # https://stackoverflow.com/posts/14023440/timeline#history_4c28e0a3-82ef-4080-9c59-11a95a097fee
 # cc by-sa 3.0
 def cheap_hash(string, length=6, default=None):
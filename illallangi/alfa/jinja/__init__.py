@@ -1,12 +1,14 @@
 import base64
 import json
 import os
-from functools import reduce
+from functools import lru_cache, reduce
 from hashlib import sha256
 
-from illallangi.alfa.functions import merge
+from illallangi.alfa.functions import merge, unique_dict
+from illallangi.alfa.metrics import QUERY_CACHE
 
 import jinja2
+from jinja2 import meta
 from jinja2.ext import Extension
 
 import jmespath
@@ -18,14 +20,22 @@ from more_itertools import one
 
 from netaddr import IPAddress
 
-import yaml
+QUERY_CACHE_SIZE = 1024
 
 
 class AlfaJinja:
-    def __init__(self, name):
+    def __init__(self, name, bytecode_cache=None):
         self.name = name
+        self.sources = {}
+        if bytecode_cache is not None:
+            os.makedirs(bytecode_cache, exist_ok=True)
         self.environment = jinja2.Environment(
-            loader=jinja2.BaseLoader,
+            loader=jinja2.FunctionLoader(self.sources.get),
+            bytecode_cache=(
+                None
+                if bytecode_cache is None
+                else jinja2.FileSystemBytecodeCache(bytecode_cache)
+            ),
             trim_blocks=True,
             lstrip_blocks=True,
             extensions=[
@@ -38,7 +48,7 @@ class AlfaJinja:
 
     def render(self, template, **kwargs):
         try:
-            jinja2_template = self.environment.from_string(source=template)
+            jinja2_template = self.get_template(template)
         except jinja2.TemplateSyntaxError as e:
             logger.error(f"Template Syntax Error Loading Template: {e}:{e.lineno})")
             return None
@@ -63,10 +73,36 @@ class AlfaJinja:
 
         return jinja2_result.strip()
 
+    def get_template(self, template):
+        # Templates are loaded by source hash so the environment's compiled
+        # template cache, and the bytecode cache if any, can be used
+        key = sha256(template.encode("utf-8")).hexdigest()
+        if key not in self.sources:
+            self.sources.clear()
+            self.environment.cache.clear()
+            self.sources[key] = template
+        return self.environment.get_template(key)
+
+    def clear_indexes(self, inputs=()):
+        "drops the label indexes of the last render pass, allowing inputs to be indexed"
+        self.environment.alfa_label_indexes.clear()
+        for input in inputs:
+            self.environment.alfa_label_indexes[id(input)] = [input, None]
+
+    def variables(self, template):
+        try:
+            return meta.find_undeclared_variables(
+                self.environment.parse(source=template)
+            )
+        except jinja2.TemplateSyntaxError as e:
+            logger.error(f"Template Syntax Error Parsing Template: {e}:{e.lineno})")
+            return None
+
 
 class AlfaJinjaFiltersExtension(Extension):
     def __init__(self, environment):
         super().__init__(environment)
+        environment.extend(alfa_label_indexes={})
         environment.filters["b64decode"] = b64decode
         environment.filters["ipaddr"] = ipaddr
         environment.filters["json_query"] = json_query
@@ -81,32 +117,86 @@ class AlfaJinjaFiltersExtension(Extension):
         environment.filters["many_by_labels"] = many_by_labels
 
 
-def by_labels(input, namespace, *labels, min=None):
+def by_labels(input, namespace, *labels, min=None, index=None):
     if not isinstance(namespace, str):
         raise TypeError("namespace must be specified and string")
     f = reduce(merge, labels)
     kind = input[0]["kind"]
-    input = [
-        i for i in input if i.get("metadata", {}).get("namespace", "") == namespace
-    ]
-    result = None
+    if index is None:
+        index = LabelIndex(input)
+    positions = None
     for k in f:
-        result = [
-            i
-            for i in result or input
-            if i.get("metadata", {}).get("labels", {}).get(k, None) == f[k]
-        ]
-        if min and len(result) < min:
-            raise LabelsFilteredInputBelowMinimumException(kind, input, k, f[k], min)
-    return result
+        positions = index.filter(namespace, k, f[k], positions)
+        if min and len(positions) < min:
+            raise LabelsFilteredInputBelowMinimumException(
+                kind, index.namespace(namespace), k, f[k], min
+            )
+    if positions is None:
+        return None
+    return [input[p] for p in sorted(positions)]
+
+
+@jinja2.pass_environment
+def many_by_labels(environment, input, namespace, *labels):
+    return by_labels(input, namespace, *labels, index=label_index(environment, input))
 
 
-def many_by_labels(input, namespace, *labels):
-    return by_labels(input, namespace, *labels)
+@jinja2.pass_environment
+def one_by_labels(environment, input, namespace, *labels):
+    return one(
+        by_labels(
+            input, namespace, *labels, min=1, index=label_index(environment, input)
+        )
+    )
+
+
+def label_index(environment, input):
+    "returns the index of a render input, building it on first use, or None for any other list"
+    # Lists built inside the template are filtered once, so are not worth keeping
+    entry = environment.alfa_label_indexes.get(id(input))
+    if entry is None or entry[0] is not input:
+        return None
+    if entry[1] is None:
+        entry[1] = LabelIndex(input)
+    return entry[1]
+
 
+class LabelIndex:
+    "An inverted index of a list of objects by namespace and label"
 
-def one_by_labels(input, namespace, *labels):
-    return one(by_labels(input, namespace, *labels, min=1))
+    def __init__(self, input):
+        self.input = input
+        self.kind = input[0]["kind"] if input else None
+        self.namespaces = {}
+        self.labels = {}
+        for p, i in enumerate(input):
+            n = i.get("metadata", {}).get("namespace", "")
+            self.namespaces.setdefault(n, set()).add(p)
+            for k, v in (i.get("metadata", {}).get("labels") or {}).items():
+                self.labels.setdefault((n, k, v), set()).add(p)
+
+    def namespace(self, namespace):
+        return [self.input[p] for p in sorted(self.namespaces.get(namespace, []))]
+
+    def filter(self, namespace, key, value, positions=None):
+        "returns the positions of objects in namespace with label key equal to value"
+        candidates = (
+            self.namespaces.get(namespace, set()) if positions is None else positions
+        )
+        try:
+            if value is None:
+                raise TypeError
+            return candidates & self.labels.get((namespace, key, value), set())
+        except TypeError:
+            # Unhashable values, and None matching an absent label, need a scan
+            return {
+                p
+                for p in candidates
+                if (self.input[p].get("metadata", {}).get("labels") or {}).get(
+                    key, None
+                )
+                == value
+            }
 
 
 class LabelsFilteredInputBelowMinimumException(Exception):
@@ -155,17 +245,33 @@ def ipaddr(value, action):
     raise NotImplementedError
 
 
-def json_query(input, f):
-    result = jmespath.search(
-        f, input, options=jmespath.Options(custom_functions=CustomFunctions())
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(f):
+    return jmespath.compile(f)
+
+
+def query_cache_info():
+    "returns the hits and misses of the compiled JMESPath expression cache"
+    return compile_query.cache_info()
+
+
+for result in ["hits", "misses", "currsize"]:
+    QUERY_CACHE.labels(result).set_function(
+        lambda result=result: getattr(query_cache_info(), result)
     )
+
+
+def search(f, input):
+    return compile_query(f).search(input, options=OPTIONS)
+
+
+def json_query(input, f):
+    result = search(f, input)
     return list(result)
 
 
 def json_query_one(input, f):
-    result = jmespath.search(
-        f, input, options=jmespath.Options(custom_functions=CustomFunctions())
-    )
+    result = search(f, input)
     if (0 if result is None else len(result)) != 1:
         raise Exception(
             f"Incorrect number of items in iterable (expected 1, received {0 if result is None else len(result)} from {f} in {json.dumps(input)})"
@@ -174,16 +280,8 @@ def json_query_one(input, f):
 
 
 def json_query_unique(input, f):
-    result = jmespath.search(
-        f, input, options=jmespath.Options(custom_functions=CustomFunctions())
-    )
-    return [
-        yaml.load(y, Loader=yaml.FullLoader) for y in {yaml.dump(d) for d in result}
-    ]
-
-
-def unique_dict(input):
-    return [yaml.load(y, Loader=yaml.FullLoader) for y in {yaml.dump(d) for d in input}]
+    result = search(f, input)
+    return unique_dict(result)
 
 
 # https://stackoverflow.com/posts/14023440/timeline#history_4c28e0a3-82ef-4080-9c59-11a95a097fee
@@ -205,6 +303,18 @@ def path_join(input):
 
 def alfa_query(
     input, parent_kind, child_kind, child_group, child_version, spec_filter=None
+):
+    return json_query(
+        input,
+        alfa_query_expression(
+            parent_kind, child_kind, child_group, child_version, spec_filter
+        ),
+    )
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def alfa_query_expression(
+    parent_kind, child_kind, child_group, child_version, spec_filter=None
 ):
     query = f"[?kind=='{parent_kind}']."
     if spec_filter is not None:
@@ -289,8 +399,7 @@ def alfa_query(
                 "__number": __number
             }}"""
     )
-    result = json_query(input, query)
-    return result
+    return query
 
 
 class CustomFunctions(functions.Functions):
@@ -306,3 +415,6 @@ class CustomFunctions(functions.Functions):
             }
             for index in ([None] + list(range(0, c or 0)))
         ]
+
+
+OPTIONS = jmespath.Options(custom_functions=CustomFunctions())
@@ -0,0 +1,75 @@
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+STAGES = ["items", "objects", "domains", "namespaces", "clusters", "renders"]
+OUTCOMES = ["created", "updated", "unchanged", "ignored", "failed"]
+QUEUES = ["events", "children", "retries"]
+
+RENDER_DURATION = Histogram(
+    "alfa_render_stage_duration_seconds",
+    "Time spent in each render stage",
+    ["template", "stage"],
+    buckets=DURATION_BUCKETS,
+)
+RENDER_BATCH = Histogram(
+    "alfa_render_batch_events",
+    "Events batched into each render",
+    ["template"],
+    buckets=BATCH_BUCKETS,
+)
+APPLY_DURATION = Histogram(
+    "alfa_apply_duration_seconds",
+    "Time spent applying a render",
+    ["template", "kind"],
+    buckets=DURATION_BUCKETS,
+)
+APPLY_OUTCOMES = Counter(
+    "alfa_apply_outcomes",
+    "Applied renders by outcome",
+    ["template", "outcome"],
+)
+QUEUE_DEPTH = Gauge(
+    "alfa_queue_depth",
+    "Items waiting in each template queue",
+    ["template", "queue"],
+)
+WATCH_RECONNECTS = Counter(
+    "alfa_watch_reconnects",
+    "Watch requests restarted",
+    ["kind"],
+)
+WATCH_EVENTS = Counter(
+    "alfa_watch_events",
+    "Watch events received",
+    ["kind", "type"],
+)
+QUERY_CACHE = Gauge(
+    "alfa_query_cache",
+    "Lookups and size of the compiled JMESPath expression cache",
+    ["result"],
+)
+
+
+def forget(template, kinds=()):
+    "removes the series of a template that has been deleted or replaced"
+    for metric, values in [
+        (RENDER_DURATION, STAGES),
+        (APPLY_DURATION, kinds),
+        (APPLY_OUTCOMES, OUTCOMES),
+        (QUEUE_DEPTH, QUEUES),
+    ]:
+        for value in values:
+            try:
+                metric.remove(template, value)
+            except KeyError:
+                pass
+    try:
+        RENDER_BATCH.remove(template)
+    except KeyError:
+        pass
+
+
+def serve(port):
+    "exposes the metrics on http://0.0.0.0:<port>/metrics"
+    start_http_server(port)
@@ -0,0 +1,94 @@
+import marshal
+import os
+import signal
+import sys
+from cProfile import Profile
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+from threading import Event, Thread, get_ident
+from time import perf_counter
+
+from loguru import logger
+
+SAMPLE_INTERVAL = 0.001
+
+state = {"enabled": False, "active": False}
+
+
+def enable(enabled=True):
+    state["enabled"] = enabled
+    logger.info(f'profiling {"enabled" if enabled else "disabled"}')
+
+
+def toggle(*args):
+    "signal handler flipping profiling on and off"
+    enable(not state["enabled"])
+
+
+def install(enabled=False):
+    "sets the initial profiling state and toggles it on SIGUSR1"
+    state["enabled"] = enabled
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, toggle)
+
+
+@contextmanager
+def profile(dump, name, deterministic=True):
+    "times a block and, while profiling is enabled, queues its pstats and collapsed stacks to the dump writer"
+    started = perf_counter()
+    if not state["enabled"] or dump is None:
+        yield
+        logger.debug(f"{name} took {perf_counter() - started:.3f} seconds")
+        return
+    # cProfile cannot nest, so only the outermost deterministic block is traced
+    profiler = Profile() if deterministic and not state["active"] else None
+    sampler = Sampler(get_ident())
+    sampler.start()
+    if profiler is not None:
+        state["active"] = True
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            state["active"] = False
+        sampler.stop()
+        logger.info(f"{name} took {perf_counter() - started:.3f} seconds")
+        if profiler is not None:
+            # The .pstats format is the marshalled stats, as Profile.dump_stats writes
+            profiler.create_stats()
+            dump.write(f"{name}.pstats", partial(marshal.dumps, profiler.stats))
+        dump.write(f"{name}.collapsed", partial(collapsed, sampler.stacks))
+
+
+def collapsed(stacks):
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+class Sampler(Thread):
+    "samples the stack of another thread into flamegraph-compatible collapsed stacks"
+
+    def __init__(self, target, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.target = target
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                stack.append(
+                    f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -0,0 +1,75 @@
+import gzip
+import json
+from queue import Empty, Full, Queue
+from threading import Thread
+from time import time
+
+from loguru import logger
+
+FLUSH_EVERY = 100
+QUEUE_SIZE = 10000
+
+
+class Recorder(Thread):
+    "Appends listed objects and raw watch lines to a gzipped JSON lines file from a background thread"
+
+    def __init__(self, path, queue_size=QUEUE_SIZE):
+        super().__init__(daemon=True)
+        self.path = path
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.queue = Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.start()
+
+    def list(self, kind, path, items):
+        self.write({"time": time(), "kind": kind, "path": path, "items": items})
+
+    def watch(self, kind, path, line):
+        self.write(
+            {
+                "time": time(),
+                "kind": kind,
+                "path": path,
+                "line": line.decode("utf-8") if isinstance(line, bytes) else line,
+            }
+        )
+
+    def write(self, record):
+        "queues record, dropping it rather than stalling the watch when the queue is full"
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            logger.warning(f"recording queue full, {self.dropped} records dropped")
+
+    def run(self):
+        unflushed = 0
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except Empty:
+                if unflushed:
+                    self.file.flush()
+                    unflushed = 0
+                record = self.queue.get()
+            if record is None:
+                self.file.close()
+                return
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            unflushed += 1
+            if unflushed >= FLUSH_EVERY:
+                self.file.flush()
+                unflushed = 0
+
+    def close(self):
+        "writes everything queued so far and closes the file"
+        self.queue.put(None)
+        self.join()
+
+
+def read(path):
+    "yields the records of a recording in order"
+    with gzip.open(path, "rt", encoding="utf-8") as infile:
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
@@ -1,2 +1,4 @@
 from .consumer import Consumer  # noqa: F401
 from .controller import Controller  # noqa: F401
+from .multiplexer import Multiplexer  # noqa: F401
+from .workqueue import TokenBucket  # noqa: F401
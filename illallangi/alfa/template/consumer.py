@@ -1,11 +1,29 @@
-import os
-from asyncio import Queue, sleep
+from asyncio import Lock, Queue, Semaphore, gather
+from collections import Counter, defaultdict
 from difflib import unified_diff
+from functools import partial
+from hashlib import sha256
 from json import dumps
 
 from aiohttp import ClientSession
 
-from illallangi.alfa.functions import recursive_get
+from illallangi.alfa.cache import Cache
+from illallangi.alfa.dump import DumpWriter, object_name
+from illallangi.alfa.functions import (
+    group_by,
+    merge,
+    path_get,
+    recursive_get,
+    unchanged,
+)
+from illallangi.alfa.jinja import AlfaJinja
+from illallangi.alfa.metrics import (
+    APPLY_DURATION,
+    APPLY_OUTCOMES,
+    QUEUE_DEPTH,
+    forget,
+)
+from illallangi.alfa.profiling import profile
 from illallangi.k8sapi import API as K8S_API
 
 from loguru import logger
@@ -15,19 +33,37 @@ import yaml
 from yarl import URL
 
 from .renderer import Renderer
+from .scheduler import Scheduler
+from .workqueue import WorkQueue
 
-COOLDOWN = 5
+CONCURRENCY = 10
+RENDER_HASH = "controllers.illallangi.enterprises/render-hash"
 
 
 class Consumer:
-    def __init__(self, api, dump, alfa_template, session=None, queue=None):
+    def __init__(
+        self,
+        api,
+        dump,
+        alfa_template,
+        session=None,
+        queue=None,
+        caches=None,
+        jinja_cache=None,
+        semaphore=None,
+        retry_bucket=None,
+        children=None,
+        child_queue=None,
+        schedule=None,
+    ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
             if not isinstance(api, K8S_API)
             else api
         )
-        self.dump = dump
+        self.dump = DumpWriter(dump) if isinstance(dump, str) else dump
         self.alfa_template = alfa_template
+        self.name = recursive_get(self.alfa_template, "metadata.name")
         self.session = ClientSession() if session is None else session
         if not isinstance(self.session, ClientSession):
             raise TypeError(
@@ -36,241 +72,466 @@ class Consumer:
         self.queue = Queue() if queue is None else queue
         if not isinstance(self.queue, Queue):
             raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.caches = {} if caches is None else caches
+        self.scheduler = Scheduler(
+            self.queue, name=self.name, **({} if schedule is None else schedule)
+        )
+        self.children = children
+        self.child_queue = Queue() if child_queue is None else child_queue
+        if not isinstance(self.child_queue, Queue):
+            raise TypeError("Expected Queue; got %s" % type(self.child_queue).__name__)
+        self.semaphore = Semaphore(
+            recursive_get(self.alfa_template, "spec.concurrency", default=CONCURRENCY)
+        )
+        self.global_semaphore = (
+            Semaphore(CONCURRENCY) if semaphore is None else semaphore
+        )
+        if not isinstance(self.global_semaphore, Semaphore):
+            raise TypeError(
+                "Expected Semaphore; got %s" % type(self.global_semaphore).__name__
+            )
+        self.jinja = AlfaJinja(
+            self.name,
+            bytecode_cache=jinja_cache,
+        )
+        self.outcomes = Counter()
+        self.passes = 0
+        self.hashes = {}
+        self.applied = {}
+        self.written = {}
+        self.latest = {}
+        self.locks = defaultdict(Lock)
+        self.retries = WorkQueue(bucket=retry_bucket)
+        for queue, depth in [
+            ("events", self.queue.qsize),
+            ("children", self.child_queue.qsize),
+            ("retries", self.retries.__len__),
+        ]:
+            QUEUE_DEPTH.labels(self.name, queue).set_function(depth)
+
+    def close(self):
+        "drops the metrics of the template, whose gauges would keep the consumer alive"
+        forget(self.name, {key[0] for key in self.latest})
 
     async def loop(self):
         while True:
-            logger.debug("sleeping until next event")
-            await self.queue.get()
-            logger.info(f"awaiting cooldown for {COOLDOWN} seconds")
-            await sleep(COOLDOWN)
-            while not self.queue.empty():
-                self.queue.get_nowait()
-            await self.consume()
-
-    async def consume(self):
-        for render in await Renderer(
-            api=self.api,
-            dump=self.dump,
-            name=recursive_get(self.alfa_template, "metadata.name"),
-            session=self.session,
-        ).render():
-            if render is None or "kind" not in render:
+            queued = await self.scheduler.next()
+            await self.consume(self.changes(queued))
+
+    async def retry(self):
+        "re-applies renders whose previous apply failed"
+        while True:
+            key, render = await self.retries.get()
+            with logger.contextualize(
+                render=f'{key[0]} {key[1] or ""}\\{key[2] or ""}',
+            ):
+                logger.info(f"retrying, {len(self.retries)} more pending")
+            self.outcomes.update(await self.apply_all([render], retry=True))
+
+    async def reconcile(self):
+        "re-applies watched children that were deleted or edited out-of-band"
+        while True:
+            event = (await self.child_queue.get())["event"]
+            if event["type"] not in ["MODIFIED", "DELETED"]:
+                continue
+            key = render_key(event["object"])
+            if key not in self.applied:
+                continue
+            if event["type"] == "MODIFIED" and unchanged(
+                self.applied[key], event["object"]
+            ):
                 continue
             with logger.contextualize(
-                render=f'{render["kind"]} {render["metadata"].get("namespace", "")}\\{render["metadata"].get("name", "")}',
+                render=f'{key[0]} {key[1] or ""}\\{key[2] or ""}',
             ):
-                try:
-                    url = URL(
-                        self.api.kinds[render["kind"]].calculate_url(
-                            render["metadata"].get("namespace", None),
-                            render["metadata"]["name"],
-                        )
+                logger.info(f'reconciling {event["type"].lower()} child')
+            self.hashes.pop(key, None)
+            # Queued as a retry, so a child another writer keeps changing is
+            # re-applied within the shared retry budget
+            self.retries.retry(key, self.applied[key])
+
+    @property
+    def incremental(self):
+        "whether a changed parent only affects the scope element it belongs to"
+        if "_incremental" not in self.__dict__ or self._incremental is None:
+            parent_kind = recursive_get(self.alfa_template, "spec.kinds.parent.kind")
+            variables = self.jinja.variables(
+                recursive_get(self.alfa_template, "spec.template")
+            )
+            self._incremental = (
+                variables is not None
+                and parent_kind not in variables
+                and parent_kind
+                not in [
+                    k["kind"]
+                    for k in recursive_get(self.alfa_template, "spec.kinds.monitored")
+                ]
+            )
+            logger.debug(f"incremental rendering {self._incremental}")
+        return self._incremental
+
+    def changes(self, queued):
+        "returns the parent objects changed by queued events, or None if all may have changed"
+        if not self.incremental:
+            return None
+        changes = []
+        for q in queued:
+            # A change to a monitored kind cannot be attributed to any parent
+            if recursive_get(q, "event.object.kind") != recursive_get(
+                self.alfa_template, "spec.kinds.parent.kind"
+            ):
+                return None
+            changes.append(q["event"]["object"])
+            if q.get("previous") is not None:
+                changes.append(q["previous"])
+        return changes
+
+    async def consume(self, changes=None):
+        self.passes += 1
+        with logger.contextualize(render_pass=self.passes), profile(
+            self.dump,
+            f"alfatemplate-{self.name}-{self.passes}-consume",
+            deterministic=False,
+        ):
+            renders = [
+                render
+                for render in await Renderer(
+                    api=self.api,
+                    dump=self.dump,
+                    name=self.name,
+                    session=self.session,
+                    jinja=self.jinja,
+                    caches=self.caches,
+                    render_pass=self.passes,
+                ).render(changes)
+                if render is not None and "kind" in render
+            ]
+            # Renders of the same object are applied in order, by a single worker
+            outcomes = Counter(
+                outcome
+                for object_outcomes in await gather(
+                    *[
+                        self.apply_all(object_renders)
+                        for object_renders in group_by(renders, render_key).values()
+                    ]
+                )
+                for outcome in object_outcomes
+            )
+            self.outcomes.update(outcomes)
+            logger.info(
+                f'applied {len(renders)} renders: {outcomes["created"] + outcomes["updated"]} written, {outcomes["unchanged"]} unchanged, {outcomes["ignored"]} ignored, {outcomes["failed"]} failed'
+            )
+
+    async def apply_all(self, renders, retry=False):
+        async with self.semaphore, self.global_semaphore:
+            outcomes = []
+            for render in renders:
+                with APPLY_DURATION.labels(self.name, render["kind"]).time():
+                    outcomes.append(await self.apply(render, retry=retry))
+                APPLY_OUTCOMES.labels(self.name, outcomes[-1]).inc()
+            return outcomes
+
+    async def apply(self, render, retry=False):
+        key = render_key(render)
+        if not retry:
+            self.latest[key] = render
+        # Passes, retries and reconciles apply each object one render at a time
+        async with self.locks[key]:
+            if retry and self.latest.get(key) is not render:
+                logger.debug(f"dropping retry of {key}, superseded by a newer render")
+                return "unchanged"
+            digest = render_hash(render)
+            # Only a child watch reports children deleted or edited out-of-band,
+            # without one every render is checked against the live object
+            if self.watching and self.hashes.get(key) == digest:
+                return "unchanged"
+            outcome = await self.apply_render(
+                merge(render, {"metadata": {"annotations": {RENDER_HASH: digest}}})
+            )
+            if outcome in ["created", "updated", "unchanged"]:
+                self.hashes[key] = digest
+                self.applied[key] = render
+            else:
+                self.hashes.pop(key, None)
+                self.applied.pop(key, None)
+                self.written.pop(key, None)
+            if outcome == "failed":
+                self.retries.retry(key, render)
+            else:
+                self.retries.forget(key)
+            return outcome
+
+    async def apply_render(self, render):
+        with logger.contextualize(
+            render=f'{render["kind"]} {render["metadata"].get("namespace", "")}\\{render["metadata"].get("name", "")}',
+        ):
+            try:
+                url = URL(
+                    self.api.kinds[render["kind"]].calculate_url(
+                        render["metadata"].get("namespace", None),
+                        render["metadata"]["name"],
                     )
+                )
+                item_get = self.live(render)
+                if item_get is None:
                     logger.info("getting")
                     async with self.session.request("get", url) as item_get_response:
-                        if item_get_response.status in [404]:
-                            url = url.parent
-                            try:
-                                logger.info(
-                                    f'Creating {render["kind"]} {render["metadata"].get("namespace","cluster")}\\{render["metadata"]["name"]}'
-                                )
-                                logger.debug(f"HTTP POST {url}: {dumps(render)}")
-                                async with self.session.request(
-                                    "post", url, json=render
-                                ) as item_post_response:
-                                    if item_post_response.headers.get(
-                                        "content-type"
-                                    ) not in [
-                                        "application/json"
-                                    ] or item_post_response.status in [
-                                        404
-                                    ]:
-                                        item_post = await item_post_response.text()
-                                        logger.error(
-                                            f"HTTP POST {url} {item_post_response.status} {item_post}"
-                                        )
-                                        continue
-                                    item_post = await item_post_response.json()
-                                    if (
-                                        item_post["kind"] == "Status"
-                                        and item_post["status"] == "Failure"
-                                    ):
-                                        logger.error(
-                                            f'HTTP POST {url} failed: {item_post["message"]} {dumps(item_post)}'
-                                        )
-                                        continue
-                                    logger.debug(
-                                        f"HTTP POST {url} {item_post_response.status} {dumps(item_post)}"
-                                    )
-                                    if self.dump:
-                                        with open(
-                                            os.path.join(
-                                                self.dump,
-                                                f'{item_post["metadata"].get("namespace","cluster")}-{item_post["metadata"]["name"]}-{item_post["kind"]}-{item_post["metadata"]["resourceVersion"]}.yaml',
-                                            ),
-                                            "w",
-                                        ) as outfile:
-                                            yaml.dump(item_post, outfile)
-
-                                    with logger.contextualize(
-                                        files=[
-                                            {
-                                                "filename": f'{item_post["metadata"].get("namespace","cluster")}-{item_post["metadata"]["name"]}-{item_post["kind"]}-{item_post["metadata"]["resourceVersion"]}.yaml',
-                                                "yaml": yaml.dump(item_post),
-                                                "title": f' - New (resourceVersion {item_post["metadata"]["resourceVersion"]})',
-                                            }
-                                        ],
-                                    ):
-                                        logger.success(
-                                            f'created resourceVersion {item_post["metadata"]["resourceVersion"]}'
-                                        )
-                            except Exception as e:
-                                logger.error(
-                                    f'Error Creating {render["kind"]}: {repr(e)}'
-                                )
-                                continue
-
-                        else:
+                        if item_get_response.status not in [404]:
                             item_get = await item_get_response.json()
-                            if self.dump:
-                                with open(
-                                    os.path.join(
-                                        self.dump,
-                                        f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-{item_get["metadata"]["resourceVersion"]}.yaml',
-                                    ),
-                                    "w",
-                                ) as outfile:
-                                    yaml.dump(item_get, outfile)
-                            render["metadata"]["resourceVersion"] = item_get[
-                                "metadata"
-                            ]["resourceVersion"]
-
-                            if not recursive_get(self.alfa_template, "spec.update"):
-                                logger.info("not updating as update set to false")
-                                continue
-
-                            if "PersistentVolumeClaim" == item_get.get("kind"):
-                                logger.info("not updating as immutable after creation")
-                                continue
-
-                            # Ugly hack to avoid race condition
-                            if "deployment.kubernetes.io/revision" in item_get.get(
-                                "metadata", {}
-                            ).get("annotations", {}):
-                                if "metadata" not in render:
-                                    render["metadata"] = {}
-                                if "annotations" not in render["metadata"]:
-                                    render["metadata"]["annotations"] = {}
-                                render["metadata"]["annotations"][
-                                    "deployment.kubernetes.io/revision"
-                                ] = item_get["metadata"]["annotations"][
-                                    "deployment.kubernetes.io/revision"
-                                ]
-
-                            # Ugly hack to avoid race condition
-                            if "clusterIP" in item_get.get("spec", {}):
-                                if "spec" not in render:
-                                    render["spec"] = {}
-                                render["spec"]["clusterIP"] = item_get["spec"][
-                                    "clusterIP"
-                                ]
-
-                            # Ugly hack to avoid cannot change healthCheckNodePort on loadBalancer service with externalTraffic=Local during update error
-                            if (
-                                "Service" == item_get.get("kind")
-                                and "externalTrafficPolicy" in item_get.get("spec", {})
-                                and "Local"
-                                == item_get.get("spec", {}).get("externalTrafficPolicy")
-                            ):
-                                render["spec"]["healthCheckNodePort"] = item_get[
-                                    "spec"
-                                ]["healthCheckNodePort"]
-
-                            try:
-                                logger.info(
-                                    f'updating resourceVersion {item_get["metadata"]["resourceVersion"]}'
-                                )
-                                logger.debug(f"HTTP PUT {url}: {dumps(render)}")
-                                async with self.session.request(
-                                    "put", url, json=render
-                                ) as item_put_response:
-                                    if item_put_response.headers.get(
-                                        "content-type"
-                                    ) not in [
-                                        "application/json"
-                                    ] or item_put_response.status in [
-                                        404
-                                    ]:
-                                        item_put = await item_put_response.text()
-                                        logger.error(
-                                            f"HTTP PUT {url} {item_put_response.status} {item_put}"
-                                        )
-                                        continue
-                                    item_put = await item_put_response.json()
-                                    if (
-                                        item_put["kind"] == "Status"
-                                        and item_put["status"] == "Failure"
-                                    ):
-                                        logger.error(
-                                            f'HTTP PUT {url} failed: {item_put["message"]} {dumps(item_put)}'
-                                        )
-                                        continue
-
-                                    if (
-                                        "resourceVersion" not in item_put["metadata"]
-                                        or "resourceVersion" not in item_get["metadata"]
-                                        or item_put["metadata"].get(
-                                            "resourceVersion", None
-                                        )
-                                        != item_get["metadata"].get(
-                                            "resourceVersion", None
-                                        )
-                                    ):
-                                        with logger.contextualize(
-                                            files=[
-                                                {
-                                                    "filename": f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-diff-{item_get["metadata"]["resourceVersion"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
-                                                    "yaml": "\n".join(
-                                                        unified_diff(
-                                                            yaml.dump(item_get),
-                                                            yaml.dump(item_put),
-                                                            fromfile=f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-{item_get["metadata"]["resourceVersion"]}.yaml',
-                                                            tofile=f'{item_put["metadata"].get("namespace","cluster")}-{item_put["metadata"]["name"]}-{item_put["kind"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
-                                                        )
-                                                    ),
-                                                    "title": f' - Diff (resourceVersion {item_get["metadata"]["resourceVersion"]}) to (resourceVersion {item_put["metadata"]["resourceVersion"]})',
-                                                },
-                                                {
-                                                    "filename": f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-{item_get["metadata"]["resourceVersion"]}.yaml',
-                                                    "yaml": yaml.dump(item_get),
-                                                    "title": f' - Original (resourceVersion {item_get["metadata"]["resourceVersion"]})',
-                                                },
-                                                {
-                                                    "filename": f'{item_put["metadata"].get("namespace","cluster")}-{item_put["metadata"]["name"]}-{item_put["kind"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
-                                                    "yaml": yaml.dump(item_put),
-                                                    "title": f' - Updated (resourceVersion {item_put["metadata"]["resourceVersion"]})',
-                                                },
-                                            ]
-                                        ):
-                                            logger.success(
-                                                f'updated from resourceVersion {item_get["metadata"]["resourceVersion"]} to resourceVersion {item_put["metadata"]["resourceVersion"]}'
-                                            )
-                                    else:
-                                        with logger.contextualize(
-                                            files=[
-                                                {
-                                                    "filename": f'{item_put["metadata"].get("namespace","cluster")}-{item_put["metadata"]["name"]}-{item_put["kind"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
-                                                    "yaml": yaml.dump(item_put),
-                                                    "title": f' - Current (resourceVersion {item_put["metadata"]["resourceVersion"]})',
-                                                }
-                                            ],
-                                        ):
-                                            logger.info(
-                                                f'no change, resourceVersion {item_put["metadata"]["resourceVersion"]}'
-                                            )
-                            except Exception as e:
-                                logger.error(f"error updating: {repr(e)}")
-                                continue
-                except Exception as e:
-                    logger.error(f"Error Getting Render: {repr(e)}")
-                    continue
+                if item_get is None:
+                    return await self.create(url.parent, render)
+                return await self.update(url, render, item_get)
+            except Exception as e:
+                logger.error(f"Error Getting Render: {repr(e)}")
+                return "failed"
+
+    @property
+    def watching(self):
+        "whether the child watch is on and has synced"
+        return self.children is not None and self.children.synced.is_set()
+
+    def live(self, render):
+        "returns the watched child render would replace, or None if it must be fetched"
+        if not self.watching:
+            return None
+        return self.children.items.get(Cache.key(render))
+
+    async def create(self, url, render):
+        try:
+            logger.info(
+                f'Creating {render["kind"]} {render["metadata"].get("namespace","cluster")}\\{render["metadata"]["name"]}'
+            )
+            logger.opt(lazy=True).debug(f"HTTP POST {url}: {{}}", lambda: dumps(render))
+            async with self.session.request(
+                "post", url, json=render
+            ) as item_post_response:
+                if item_post_response.headers.get("content-type") not in [
+                    "application/json"
+                ] or item_post_response.status in [404]:
+                    item_post = await item_post_response.text()
+                    logger.error(
+                        f"HTTP POST {url} {item_post_response.status} {item_post}"
+                    )
+                    return "failed"
+                item_post = await item_post_response.json()
+                if item_post["kind"] == "Status" and item_post["status"] == "Failure":
+                    logger.error(
+                        f'HTTP POST {url} failed: {item_post["message"]} {dumps(item_post)}'
+                    )
+                    return "failed"
+                self.written[render_key(render)] = item_post
+                if self.children is not None:
+                    self.children.store(item_post)
+                logger.opt(lazy=True).debug(
+                    f"HTTP POST {url} {item_post_response.status} {{}}",
+                    lambda: dumps(item_post),
+                )
+                if self.dump:
+                    self.dump.write(
+                        f'{object_name(item_post)}-{item_post["metadata"]["resourceVersion"]}.yaml',
+                        partial(yaml.dump, item_post),
+                        template=self.name,
+                        object=object_name(item_post),
+                        resource_version=item_post["metadata"]["resourceVersion"],
+                    )
+
+                with logger.contextualize(
+                    files=[
+                        {
+                            "filename": f'{item_post["metadata"].get("namespace","cluster")}-{item_post["metadata"]["name"]}-{item_post["kind"]}-{item_post["metadata"]["resourceVersion"]}.yaml',
+                            "yaml": partial(yaml.dump, item_post),
+                            "title": f' - New (resourceVersion {item_post["metadata"]["resourceVersion"]})',
+                        }
+                    ],
+                ):
+                    logger.success(
+                        f'created resourceVersion {item_post["metadata"]["resourceVersion"]}'
+                    )
+                return "created"
+        except Exception as e:
+            logger.error(f'Error Creating {render["kind"]}: {repr(e)}')
+            return "failed"
+
+    async def update(self, url, render, item_get):
+        if self.dump:
+            self.dump.write(
+                f'{object_name(item_get)}-{item_get["metadata"]["resourceVersion"]}.yaml',
+                partial(yaml.dump, item_get),
+                template=self.name,
+                object=object_name(item_get),
+                resource_version=item_get["metadata"]["resourceVersion"],
+            )
+        render = merge(
+            render,
+            {"metadata": {"resourceVersion": item_get["metadata"]["resourceVersion"]}},
+        )
+
+        # A watched child must also match what our last write returned, as an
+        # out-of-band edit may have kept the annotation. After a restart there is
+        # no such write, so the annotation is trusted and the child becomes the
+        # copy later events are compared with.
+        key = render_key(render)
+        if path_get(item_get, ("metadata", "annotations", RENDER_HASH)) == path_get(
+            render, ("metadata", "annotations", RENDER_HASH)
+        ) and (
+            self.children is None
+            or key not in self.written
+            or unchanged(self.written[key], item_get)
+        ):
+            if self.children is not None:
+                self.written.setdefault(key, item_get)
+            logger.info(
+                f'unchanged render, resourceVersion {item_get["metadata"]["resourceVersion"]}'
+            )
+            return "unchanged"
+
+        if not recursive_get(self.alfa_template, "spec.update"):
+            logger.info("not updating as update set to false")
+            return "ignored"
+
+        if "PersistentVolumeClaim" == item_get.get("kind"):
+            logger.info("not updating as immutable after creation")
+            return "ignored"
+
+        # Ugly hack to avoid race condition
+        if "deployment.kubernetes.io/revision" in (
+            item_get.get("metadata", {}).get("annotations") or {}
+        ):
+            render = merge(
+                render,
+                {
+                    "metadata": {
+                        "annotations": {
+                            "deployment.kubernetes.io/revision": item_get["metadata"][
+                                "annotations"
+                            ]["deployment.kubernetes.io/revision"]
+                        }
+                    }
+                },
+            )
+
+        # Ugly hack to avoid race condition
+        if "clusterIP" in item_get.get("spec", {}):
+            render = merge(
+                render, {"spec": {"clusterIP": item_get["spec"]["clusterIP"]}}
+            )
+
+        # Ugly hack to avoid cannot change healthCheckNodePort on loadBalancer service with externalTraffic=Local during update error
+        if (
+            "Service" == item_get.get("kind")
+            and "externalTrafficPolicy" in item_get.get("spec", {})
+            and "Local" == item_get.get("spec", {}).get("externalTrafficPolicy")
+        ):
+            render = merge(
+                render,
+                {
+                    "spec": {
+                        "healthCheckNodePort": item_get["spec"]["healthCheckNodePort"]
+                    }
+                },
+            )
+
+        if unchanged(render, item_get, self.applied.get(key)):
+            logger.info(
+                f'unchanged, resourceVersion {item_get["metadata"]["resourceVersion"]}'
+            )
+            self.written[key] = item_get
+            return "unchanged"
+
+        try:
+            logger.info(
+                f'updating resourceVersion {item_get["metadata"]["resourceVersion"]}'
+            )
+            logger.opt(lazy=True).debug(f"HTTP PUT {url}: {{}}", lambda: dumps(render))
+            async with self.session.request(
+                "put", url, json=render
+            ) as item_put_response:
+                if item_put_response.headers.get("content-type") not in [
+                    "application/json"
+                ] or item_put_response.status in [404]:
+                    item_put = await item_put_response.text()
+                    logger.error(
+                        f"HTTP PUT {url} {item_put_response.status} {item_put}"
+                    )
+                    return "failed"
+                item_put = await item_put_response.json()
+                if item_put["kind"] == "Status" and item_put["status"] == "Failure":
+                    logger.error(
+                        f'HTTP PUT {url} failed: {item_put["message"]} {dumps(item_put)}'
+                    )
+                    return "failed"
+                self.written[key] = item_put
+                # The watch event may arrive after the next apply of this child
+                if self.children is not None:
+                    self.children.store(item_put)
+
+                if (
+                    "resourceVersion" not in item_put["metadata"]
+                    or "resourceVersion" not in item_get["metadata"]
+                    or item_put["metadata"].get("resourceVersion", None)
+                    != item_get["metadata"].get("resourceVersion", None)
+                ):
+                    with logger.contextualize(
+                        files=[
+                            {
+                                "filename": f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-diff-{item_get["metadata"]["resourceVersion"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
+                                "yaml": lambda: "\n".join(
+                                    unified_diff(
+                                        yaml.dump(item_get),
+                                        yaml.dump(item_put),
+                                        fromfile=f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-{item_get["metadata"]["resourceVersion"]}.yaml',
+                                        tofile=f'{item_put["metadata"].get("namespace","cluster")}-{item_put["metadata"]["name"]}-{item_put["kind"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
+                                    )
+                                ),
+                                "title": f' - Diff (resourceVersion {item_get["metadata"]["resourceVersion"]}) to (resourceVersion {item_put["metadata"]["resourceVersion"]})',
+                            },
+                            {
+                                "filename": f'{item_get["metadata"].get("namespace","cluster")}-{item_get["metadata"]["name"]}-{item_get["kind"]}-{item_get["metadata"]["resourceVersion"]}.yaml',
+                                "yaml": partial(yaml.dump, item_get),
+                                "title": f' - Original (resourceVersion {item_get["metadata"]["resourceVersion"]})',
+                            },
+                            {
+                                "filename": f'{item_put["metadata"].get("namespace","cluster")}-{item_put["metadata"]["name"]}-{item_put["kind"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
+                                "yaml": partial(yaml.dump, item_put),
+                                "title": f' - Updated (resourceVersion {item_put["metadata"]["resourceVersion"]})',
+                            },
+                        ]
+                    ):
+                        logger.success(
+                            f'updated from resourceVersion {item_get["metadata"]["resourceVersion"]} to resourceVersion {item_put["metadata"]["resourceVersion"]}'
+                        )
+                    return "updated"
+                else:
+                    with logger.contextualize(
+                        files=[
+                            {
+                                "filename": f'{item_put["metadata"].get("namespace","cluster")}-{item_put["metadata"]["name"]}-{item_put["kind"]}-{item_put["metadata"]["resourceVersion"]}.yaml',
+                                "yaml": partial(yaml.dump, item_put),
+                                "title": f' - Current (resourceVersion {item_put["metadata"]["resourceVersion"]})',
+                            }
+                        ],
+                    ):
+                        logger.info(
+                            f'no change, resourceVersion {item_put["metadata"]["resourceVersion"]}'
+                        )
+                    return "unchanged"
+        except Exception as e:
+            logger.error(f"error updating: {repr(e)}")
+            return "failed"
+
+
+def render_key(render):
+    return (
+        render["kind"],
+        render["metadata"].get("namespace") or None,
+        render["metadata"].get("name", None),
+    )
+
+
+def render_hash(render):
+    "returns a digest of the canonical JSON form of render"
+    return sha256(
+        dumps(render, sort_keys=True, separators=(",", ":"), default=str).encode(
+            "utf-8"
+        )
+    ).hexdigest()
@@ -2,6 +2,7 @@ from asyncio import Queue, gather, get_event_loop
 
 from aiohttp import ClientSession
 
+from illallangi.alfa.dump import DumpWriter
 from illallangi.alfa.functions import recursive_get
 from illallangi.k8sapi import API as K8S_API
 
@@ -10,18 +11,35 @@ from loguru import logger
 from yarl import URL
 
 from .consumer import Consumer
-from .producer import Producer
+from .multiplexer import Multiplexer
 
 
 class Controller:
-    def __init__(self, api, dump, alfa_template, session=None, queue=None):
+    def __init__(
+        self,
+        api,
+        dump,
+        alfa_template,
+        session=None,
+        queue=None,
+        caches=None,
+        multiplexer=None,
+        jinja_cache=None,
+        semaphore=None,
+        retry_bucket=None,
+        schedule=None,
+    ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
             if not isinstance(api, K8S_API)
             else api
         )
-        self.dump = dump
+        self.dump = DumpWriter(dump) if isinstance(dump, str) else dump
         self.alfa_template = alfa_template
+        self.jinja_cache = jinja_cache
+        self.semaphore = semaphore
+        self.retry_bucket = retry_bucket
+        self.schedule = schedule
         self.session = ClientSession() if session is None else session
         if not isinstance(self.session, ClientSession):
             raise TypeError(
@@ -30,6 +48,27 @@ class Controller:
         self.queue = Queue() if queue is None else queue
         if not isinstance(self.queue, Queue):
             raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.owns_multiplexer = multiplexer is None
+        self.multiplexer = (
+            Multiplexer(api=self.api, session=self.session)
+            if multiplexer is None
+            else multiplexer
+        )
+        self.caches = {
+            **({} if caches is None else caches),
+            **{
+                kind: self.multiplexer.subscribe(kind, self.queue)
+                for kind in self.kinds
+            },
+        }
+        self.child_queue = Queue()
+        self.children = (
+            self.multiplexer.subscribe(
+                self.child_kind, self.child_queue, label_selector=self.child_selector
+            )
+            if recursive_get(self.alfa_template, "spec.kinds.child.watch")
+            else None
+        )
 
     async def loop(self):
         with logger.contextualize(
@@ -41,29 +80,65 @@ class Controller:
             logger.debug("loop completed")
 
     def get_coroutines(self):
-        yield Consumer(
+        consumer = Consumer(
             api=self.api,
             dump=self.dump,
             alfa_template=self.alfa_template,
             session=self.session,
             queue=self.queue,
-        ).loop()
-
-        for kind in [
-            *[recursive_get(self.alfa_template, "spec.kinds.parent.kind")],
-            *[
-                kind["kind"]
-                for kind in recursive_get(self.alfa_template, "spec.kinds.monitored")
-            ],
-        ]:
-            yield Producer(
-                api=self.api,
-                kind=kind,
-                session=self.session,
-                queue=self.queue,
-            ).loop()
+            caches=self.caches,
+            jinja_cache=self.jinja_cache,
+            semaphore=self.semaphore,
+            retry_bucket=self.retry_bucket,
+            children=self.children,
+            child_queue=self.child_queue,
+            schedule=self.schedule,
+        )
+        self.consumer = consumer
+        yield consumer.loop()
+        yield consumer.retry()
+
+        if self.children is not None:
+            yield consumer.reconcile()
+
+        if self.owns_multiplexer:
+            yield self.multiplexer.loop()
+
+    @property
+    def kinds(self):
+        return list(
+            dict.fromkeys(
+                [
+                    recursive_get(self.alfa_template, "spec.kinds.parent.kind"),
+                    *[
+                        kind["kind"]
+                        for kind in recursive_get(
+                            self.alfa_template, "spec.kinds.monitored"
+                        )
+                    ],
+                ]
+            )
+        )
+
+    @property
+    def child_kind(self):
+        return recursive_get(self.alfa_template, "spec.kinds.child.kind")
+
+    @property
+    def child_selector(self):
+        "selects the children managed by this template"
+        return f'{recursive_get(self.alfa_template, "spec.labels.managedBy")}={recursive_get(self.alfa_template, "metadata.name")}'
 
     def cancel(self):
+        if hasattr(self, "consumer") and self.consumer is not None:
+            self.consumer.close()
+            self.consumer = None
+        for kind in self.kinds:
+            self.multiplexer.unsubscribe(kind, self.queue)
+        if self.children is not None:
+            self.multiplexer.unsubscribe(
+                self.child_kind, self.child_queue, label_selector=self.child_selector
+            )
         if (
             not get_event_loop().is_closed()
             and hasattr(self, "task")
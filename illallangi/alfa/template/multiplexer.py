@@ -0,0 +1,141 @@
+from asyncio import Queue, gather, get_event_loop, sleep
+from time import monotonic
+
+from aiohttp import ClientSession
+
+from illallangi.alfa.cache import Cache
+from illallangi.alfa.functions import recursive_get
+from illallangi.alfa.metrics import WATCH_RECONNECTS
+from illallangi.k8sapi import API as K8S_API
+
+from loguru import logger
+
+from yarl import URL
+
+from .producer import Producer
+
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+
+
+class Multiplexer:
+    def __init__(self, api, session=None, recorder=None):
+        self.api = (
+            K8S_API(URL(api) if not isinstance(api, URL) else api)
+            if not isinstance(api, K8S_API)
+            else api
+        )
+        self.session = ClientSession() if session is None else session
+        if not isinstance(self.session, ClientSession):
+            raise TypeError(
+                "Expected ClientSession; got %s" % type(self.session).__name__
+            )
+        self.recorder = recorder
+        self.watches = {}
+        self.pending = Queue()
+
+    async def loop(self):
+        with logger.contextualize():
+            logger.debug("loop starting")
+            while True:
+                watch = await self.pending.get()
+                if watch in self.watches.values():
+                    watch.task = get_event_loop().create_task(watch.loop())
+            logger.debug("loop completed")
+
+    def subscribe(self, kind, queue, label_selector=None):
+        key = (kind, label_selector)
+        if key not in self.watches:
+            logger.info(f"starting {kind} watch")
+            self.watches[key] = Watch(
+                api=self.api,
+                kind=kind,
+                session=self.session,
+                label_selector=label_selector,
+                recorder=self.recorder,
+            )
+            self.pending.put_nowait(self.watches[key])
+        self.watches[key].subscribe(queue)
+        return self.watches[key].cache
+
+    def unsubscribe(self, kind, queue, label_selector=None):
+        key = (kind, label_selector)
+        if key in self.watches and self.watches[key].unsubscribe(queue) == 0:
+            logger.info(f"stopping {kind} watch")
+            self.watches.pop(key).cancel()
+
+
+class Watch:
+    def __init__(self, api, kind, session, label_selector=None, recorder=None):
+        self.kind = kind
+        self.cache = Cache(kind)
+        self.queue = Queue()
+        self.subscribers = []
+        self.replayed = {}
+        self.producer = Producer(
+            api=api,
+            kind=kind,
+            session=session,
+            queue=self.queue,
+            cache=self.cache,
+            label_selector=label_selector,
+            recorder=recorder,
+        )
+        self.task = None
+
+    async def loop(self):
+        await gather(self.produce(), self.fan_out())
+
+    async def produce(self):
+        "runs the producer, restarting it with backoff so subscribers never read a dead watch"
+        failures = 0
+        while True:
+            started = monotonic()
+            try:
+                await self.producer.loop()
+            except Exception as e:
+                # A watch that ran for a while before failing starts over
+                if monotonic() - started > MAX_RESTART_DELAY:
+                    failures = 0
+                delay = min(RESTART_DELAY * 2**failures, MAX_RESTART_DELAY)
+                failures += 1
+                logger.error(
+                    f"{self.kind} watch failed: {repr(e)}, restarting in {delay}s"
+                )
+                WATCH_RECONNECTS.labels(self.kind).inc()
+                await sleep(delay)
+
+    async def fan_out(self):
+        while True:
+            queued = await self.queue.get()
+            resource_version = int(
+                recursive_get(
+                    queued, "event.object.metadata.resourceVersion", default=0
+                )
+            )
+            for subscriber in self.subscribers:
+                # The replay to a late subscriber already covers events queued
+                # before it subscribed
+                if subscriber in self.replayed:
+                    if resource_version <= self.replayed[subscriber]:
+                        continue
+                    del self.replayed[subscriber]
+                subscriber.put_nowait(queued)
+
+    def subscribe(self, queue):
+        self.subscribers.append(queue)
+        # Replay the current state to a late subscriber, as a new watch would
+        if self.cache.synced.is_set():
+            self.replayed[queue] = self.cache.resource_version
+            for item in self.cache.values():
+                queue.put_nowait({"event": {"type": "ADDED", "object": item}})
+
+    def unsubscribe(self, queue):
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+            self.replayed.pop(queue, None)
+        return len(self.subscribers)
+
+    def cancel(self):
+        if not get_event_loop().is_closed() and self.task is not None:
+            self.task.cancel()
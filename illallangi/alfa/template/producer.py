@@ -4,6 +4,8 @@ from asyncio.exceptions import TimeoutError
 
 from aiohttp import ClientSession
 
+from illallangi.alfa.cache import list_items
+from illallangi.alfa.metrics import WATCH_EVENTS, WATCH_RECONNECTS
 from illallangi.k8sapi import API as K8S_API
 
 from loguru import logger
@@ -20,6 +22,9 @@ class Producer:
         kind,
         session=None,
         queue=None,
+        cache=None,
+        label_selector=None,
+        recorder=None,
     ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
@@ -35,6 +40,9 @@ class Producer:
         self.queue = Queue() if queue is None else queue
         if not isinstance(self.queue, Queue):
             raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.cache = cache
+        self.recorder = recorder
+        self.label_selector = label_selector
 
     async def loop(self):
         with logger.contextualize(
@@ -42,9 +50,17 @@ class Producer:
         ):
             logger.debug("starting loop")
             resource_version = 0
+            reconnecting = False
             while True:
+                if reconnecting:
+                    WATCH_RECONNECTS.labels(self.kind).inc()
+                reconnecting = True
                 try:
+                    if self.cache is not None and resource_version == 0:
+                        resource_version = await self.list()
                     params = {"watch": 1}
+                    if self.label_selector is not None:
+                        params["labelSelector"] = self.label_selector
                     if resource_version > 0:
                         params["resourceVersion"] = resource_version
                     async with self.session.request(
@@ -55,6 +71,12 @@ class Producer:
                         logger.info(f"connected to {response.url}")
                         async for line in response.content:
                             if line:
+                                if self.recorder is not None:
+                                    self.recorder.watch(
+                                        self.kind,
+                                        self.api.kinds[self.kind].rest_path.path,
+                                        line,
+                                    )
                                 try:
                                     event = json.loads(line)
                                 except json.decoder.JSONDecodeError as e:
@@ -62,6 +84,7 @@ class Producer:
                                         f'JSONDecodeError "{repr(e)}" on "{line}", continuing.'
                                     )
                                     continue
+                                WATCH_EVENTS.labels(self.kind, event["type"]).inc()
                                 if (
                                     event["type"] == "ERROR"
                                     and event["object"]["reason"] == "Expired"
@@ -71,7 +94,10 @@ class Producer:
                                         f"connection expired, restarting at resourceVersion {resource_version}"
                                     )
                                     break
-                                await self.handle_event(event)
+                                previous = None
+                                if self.cache is not None and event["type"] != "ERROR":
+                                    previous = self.cache.apply(event)
+                                await self.handle_event(event, previous)
                                 if (
                                     int(event["object"]["metadata"]["resourceVersion"])
                                     > resource_version
@@ -88,8 +114,24 @@ class Producer:
                     )
             logger.debug("completed loop")
 
-    async def handle_event(self, event):
-        logger.trace(f"{json.dumps(event)}")
+    async def list(self):
+        items, resource_version = await list_items(
+            self.session, self.api, self.kind, label_selector=self.label_selector
+        )
+        self.cache.replace(items, resource_version)
+        if self.recorder is not None:
+            self.recorder.list(
+                self.kind, self.api.kinds[self.kind].rest_path.path, items
+            )
+        logger.info(
+            f"listed {len(items)} {self.kind}(s) at resourceVersion {resource_version}"
+        )
+        for item in items:
+            await self.handle_event({"type": "ADDED", "object": item})
+        return resource_version
+
+    async def handle_event(self, event, previous=None):
+        logger.opt(lazy=True).trace("{}", lambda: json.dumps(event))
         if "name" not in event["object"]["metadata"].keys():
             logger.debug("ignoring event with no object.metadata.name")
             return
@@ -106,4 +148,4 @@ class Producer:
             f'handling {event["object"]["metadata"]["name"]} {event["type"].lower()} (resourceVersion {event["object"]["metadata"]["resourceVersion"]})'
         )
 
-        await self.queue.put({"event": event})
+        await self.queue.put({"event": event, "previous": previous})
@@ -1,10 +1,22 @@
-import os
-from functools import reduce
+from asyncio import gather
+from contextlib import contextmanager
+from functools import partial, reduce
 
 from aiohttp import ClientSession
 
-from illallangi.alfa.functions import cheap_hash, common, merge, recursive_get
+from illallangi.alfa.cache import list_items
+from illallangi.alfa.dump import DumpWriter
+from illallangi.alfa.functions import (
+    cheap_hash,
+    common,
+    group_by,
+    merge,
+    path_get,
+    recursive_get,
+)
 from illallangi.alfa.jinja import AlfaJinja
+from illallangi.alfa.metrics import RENDER_DURATION
+from illallangi.alfa.profiling import profile
 from illallangi.k8sapi import API as K8S_API
 
 from loguru import logger
@@ -15,329 +27,326 @@ import yaml
 
 from yarl import URL
 
+from .settings import Settings
+
 
 class Renderer:
-    def __init__(self, api, dump, name, session=None, jinja=None):
+    def __init__(
+        self,
+        api,
+        dump,
+        name,
+        session=None,
+        jinja=None,
+        caches=None,
+        render_pass=None,
+    ):
         self.api = (
             K8S_API(URL(api) if not isinstance(api, URL) else api)
             if not isinstance(api, K8S_API)
             else api
         )
-        self.dump = dump
+        self.dump = DumpWriter(dump) if isinstance(dump, str) else dump
         self.name = name
         self.jinja = AlfaJinja(name) if jinja is None else jinja
+        self.caches = {} if caches is None else caches
+        self.render_pass = render_pass
         self.session = ClientSession() if session is None else session
         if not isinstance(self.session, ClientSession):
             raise TypeError(
                 "Expected ClientSession; got %s" % type(self.session).__name__
             )
 
-    async def render(self):
-        logger.info(f"Rendering AlfaTemplate {self.name} in {await self.scope} scope")
-        return await self.renders
+    @contextmanager
+    def stage(self, name, deterministic=True):
+        "times, and optionally profiles, a render stage"
+        with RENDER_DURATION.labels(self.name, name).time(), profile(
+            self.dump,
+            f"alfatemplate-{self.name}-{self.render_pass}-{name}",
+            deterministic=deterministic,
+        ):
+            yield
+
+    async def render(self, changes=None):
+        settings = await self.settings
+        logger.info(f"Rendering AlfaTemplate {self.name} in {settings.scope} scope")
+        if changes is None:
+            return await self.renders
+        return await self.get_renders(await self.affected(changes))
+
+    async def affected(self, changes):
+        "returns the scope elements affected by a list of changed parent objects"
+        settings = await self.settings
+        scope = settings.scope.lower()
+        if scope == "object":
+            uids = {recursive_get(c, "metadata.uid") for c in changes}
+            result = [
+                o
+                for i, o in zip(
+                    (await self.items)[settings.parent_kind], await self.objects
+                )
+                if recursive_get(i, "metadata.uid") in uids
+            ]
+        elif scope == "domain":
+            domains = {recursive_get(c, "spec.domainName") for c in changes}
+            result = [
+                d
+                for d in await self.domains
+                if recursive_get(d, "spec.domainName") in domains
+            ]
+        elif scope == "namespace":
+            namespaces = {recursive_get(c, "metadata.namespace") for c in changes}
+            result = [
+                n
+                for n in await self.namespaces
+                if recursive_get(n, "metadata.namespace") in namespaces
+            ]
+        else:
+            result = await getattr(self, f"{scope}s")
+        logger.info(
+            f" - {len(result)} {settings.scope}(s) affected by {len(changes)} change(s)"
+        )
+        return result
 
     @property
     async def items(self):
         if "_items" not in self.__dict__ or self._items is None:
-            logger.info(f'Getting {"s, ".join(await self.kinds)}s')
-            self._items = {k: await self.get_items(k) for k in await self.kinds}
-            for k in self._items:
-                if self.dump:
-                    with open(
-                        os.path.join(
-                            self.dump,
+            kinds = (await self.settings).kinds
+            # cProfile would attribute other coroutines' work to an awaiting stage
+            with self.stage("items", deterministic=False):
+                logger.info(f'Getting {"s, ".join(kinds)}s')
+                self._items = dict(
+                    zip(kinds, await gather(*[self.get_items(k) for k in kinds]))
+                )
+                for k in self._items:
+                    if self.dump:
+                        self.dump.write(
                             f"alfatemplate-{self.name}-{k.lower()}s.yaml",
-                        ),
-                        "w",
-                    ) as outfile:
-                        outfile.write(yaml.dump_all(self._items[k]))
-                logger.info(f" - Got {len(self._items[k])} {k}(s)")
+                            partial(yaml.dump_all, self._items[k]),
+                            template=self.name,
+                        )
+                    logger.info(f" - Got {len(self._items[k])} {k}(s)")
         return self._items
 
     @property
     async def objects(self):
         if "_objects" not in self.__dict__ or self._objects is None:
-            logger.info("Getting Objects")
-            self._objects = [
-                {
-                    "kind": (await self.child).kind,
-                    "apiVersion": (await self.child).api_group.group_version,
-                    "metadata": {
-                        "labels": {
-                            (await self.labels_name): recursive_get(
-                                item,
-                                f"metadata#labels#{await self.labels_name}",
-                                sep="#",
-                            )
-                            or (await self.parent_kind).lower(),
-                            (await self.labels_instance): recursive_get(
-                                item,
-                                f"metadata#labels#{await self.labels_instance}",
-                                sep="#",
-                            )
-                            or recursive_get(item, "metadata.name", default=""),
-                            (await self.labels_domain_name): recursive_get(
-                                item,
-                                f"metadata#labels#{await self.labels_domain_name}",
-                                sep="#",
-                            )
-                            or recursive_get(item, "spec.domainName", default=""),
-                            (await self.labels_component): recursive_get(
-                                item,
-                                f"metadata#labels#{await self.labels_component}",
-                                sep="#",
-                            )
-                            or await self.component
-                            or "",
-                            (await self.labels_managed_by): self.name,
+            settings = await self.settings
+            parents = (await self.items)[settings.parent_kind]
+            with self.stage("objects"):
+                logger.info("Getting Objects")
+                parents_by_uid = group_by(
+                    parents, lambda i: recursive_get(i, "metadata.uid")
+                )
+                self._objects = [
+                    {
+                        "kind": settings.child.kind,
+                        "apiVersion": settings.child.api_group.group_version,
+                        "metadata": {
+                            "labels": {
+                                **selector,
+                                settings.labels_managed_by: self.name,
+                            },
+                            "namespace": recursive_get(item, "metadata.namespace"),
+                            "ownerReferences": [
+                                owner_reference(i)
+                                for i in parents_by_uid[
+                                    recursive_get(item, "metadata.uid")
+                                ]
+                                if settings.owner_references
+                            ],
                         },
-                        "namespace": recursive_get(item, "metadata.namespace"),
-                        "ownerReferences": [
-                            {
-                                "apiVersion": recursive_get(i, "apiVersion"),
-                                "blockOwnerDeletion": True,
-                                "controller": False,
-                                "kind": recursive_get(i, "kind"),
-                                "name": recursive_get(i, "metadata.name"),
-                                "uid": recursive_get(i, "metadata.uid"),
-                            }
-                            for i in (await self.items)[await self.parent_kind]
-                            if (await self.owner_references)
-                            and recursive_get(i, "metadata.uid")
-                            == recursive_get(item, "metadata.uid")
-                        ],
-                    },
-                    "selector": {
-                        (await self.labels_name): recursive_get(
-                            item, f"metadata#labels#{await self.labels_name}", sep="#"
-                        )
-                        or (await self.parent_kind).lower(),
-                        (await self.labels_instance): recursive_get(
-                            item,
-                            f"metadata#labels#{await self.labels_instance}",
-                            sep="#",
-                        )
-                        or recursive_get(item, "metadata.name", default=""),
-                        (await self.labels_domain_name): recursive_get(
-                            item,
-                            f"metadata#labels#{await self.labels_domain_name}",
-                            sep="#",
-                        )
-                        or recursive_get(item, "spec.domainName", default=""),
-                        (await self.labels_component): recursive_get(
-                            item,
-                            f"metadata#labels#{await self.labels_component}",
-                            sep="#",
-                        )
-                        or await self.component
-                        or "",
-                    },
-                    "_name": "-".join(
-                        [
-                            i
-                            for i in [
-                                (await self.parent_kind).lower(),
-                                recursive_get(item, "metadata.name"),
-                                cheap_hash(recursive_get(item, "spec.domainName")),
-                                await self.component,
+                        "selector": selector,
+                        "_name": "-".join(
+                            [
+                                i
+                                for i in [
+                                    settings.parent_kind.lower(),
+                                    recursive_get(item, "metadata.name"),
+                                    cheap_hash(recursive_get(item, "spec.domainName")),
+                                    settings.component,
+                                ]
+                                if i
                             ]
-                            if i
-                        ]
-                    ),
-                    "spec": recursive_get(item, "spec"),
-                    "subsets": recursive_get(item, "subsets"),
-                }
-                for item in (await self.items)[await self.parent_kind]
-            ]
-            if self.dump:
-                with open(
-                    os.path.join(self.dump, f"alfatemplate-{self.name}-objects.yaml"),
-                    "w",
-                ) as outfile:
-                    outfile.write(yaml.dump_all(self._objects))
-            logger.info(f" - Got {len(self._objects)} Objects")
+                        ),
+                        "spec": recursive_get(item, "spec"),
+                        "subsets": recursive_get(item, "subsets"),
+                    }
+                    for item, selector in (
+                        (item, object_selector(settings, item)) for item in parents
+                    )
+                ]
+                if self.dump:
+                    self.dump.write(
+                        f"alfatemplate-{self.name}-objects.yaml",
+                        partial(yaml.dump_all, self._objects),
+                        template=self.name,
+                    )
+                logger.info(f" - Got {len(self._objects)} Objects")
         return self._objects
 
     @property
     async def domains(self):
         if "_domains" not in self.__dict__ or self._domains is None:
-            logger.info("Getting Domains")
-            self._domains = [
-                reduce(
-                    merge,
-                    [
-                        reduce(
-                            common,
-                            [
-                                o
-                                for o in (await self.objects)
-                                if recursive_get(o, "spec.domainName") == d
-                            ],
-                        ),
-                        {
-                            "metadata": {
-                                "labels": {(await self.labels_instance): ""},
-                                "ownerReferences": [
-                                    {
-                                        "apiVersion": recursive_get(i, "apiVersion"),
-                                        "blockOwnerDeletion": True,
-                                        "controller": False,
-                                        "kind": recursive_get(i, "kind"),
-                                        "name": recursive_get(i, "metadata.name"),
-                                        "uid": recursive_get(i, "metadata.uid"),
-                                    }
-                                    for i in (await self.items)[await self.parent_kind]
-                                    if (await self.owner_references)
-                                    and recursive_get(i, "spec.domainName") == d
-                                ],
-                            },
-                            "selector": {(await self.labels_instance): ""},
-                            "_name": "-".join(
-                                [
-                                    i
-                                    for i in [
-                                        (await self.parent_kind).lower(),
-                                        cheap_hash(d),
-                                        await self.component,
-                                    ]
-                                    if i
-                                ]
-                            ),
-                        },
-                        {
-                            "objects": [
-                                o
-                                for o in (await self.objects)
-                                if recursive_get(o, "spec.domainName") == d
-                            ]
-                        },
-                    ],
+            settings = await self.settings
+            parents = (await self.items)[settings.parent_kind]
+            objects = await self.objects
+            with self.stage("domains"):
+                logger.info("Getting Domains")
+                parents_by_domain = group_by(
+                    parents, lambda i: recursive_get(i, "spec.domainName")
                 )
-                for d in {
-                    recursive_get(item, "spec.domainName")
-                    for item in (await self.items)[await self.parent_kind]
-                }
-            ]
-            if self.dump:
-                with open(
-                    os.path.join(self.dump, f"alfatemplate-{self.name}-domains.yaml"),
-                    "w",
-                ) as outfile:
-                    outfile.write(yaml.dump_all(self._domains))
-            logger.info(f" - Got {len(self._domains)} Domains")
+                objects_by_domain = group_by(
+                    objects, lambda o: recursive_get(o, "spec.domainName")
+                )
+                self._domains = [
+                    reduce(
+                        merge,
+                        [
+                            reduce(common, objects_by_domain[d]),
+                            {
+                                "metadata": {
+                                    "labels": {settings.labels_instance: ""},
+                                    "ownerReferences": [
+                                        owner_reference(i)
+                                        for i in domain_parents
+                                        if settings.owner_references
+                                    ],
+                                },
+                                "selector": {settings.labels_instance: ""},
+                                "_name": "-".join(
+                                    [
+                                        i
+                                        for i in [
+                                            settings.parent_kind.lower(),
+                                            cheap_hash(d),
+                                            settings.component,
+                                        ]
+                                        if i
+                                    ]
+                                ),
+                            },
+                            {"objects": objects_by_domain[d]},
+                        ],
+                    )
+                    for d, domain_parents in parents_by_domain.items()
+                ]
+                if self.dump:
+                    self.dump.write(
+                        f"alfatemplate-{self.name}-domains.yaml",
+                        partial(yaml.dump_all, self._domains),
+                        template=self.name,
+                    )
+                logger.info(f" - Got {len(self._domains)} Domains")
         return self._domains
 
     @property
     async def namespaces(self):
         if "_namespaces" not in self.__dict__ or self._namespaces is None:
-            logger.info("Getting Namespaces")
-            self._namespaces = [
-                reduce(
-                    merge,
-                    [
-                        reduce(
-                            common,
-                            [
-                                o
-                                for o in (await self.objects)
-                                if recursive_get(o, "metadata.namespace") == n
-                            ],
-                        ),
-                        {
-                            "metadata": {
-                                "labels": {(await self.labels_domain_name): ""},
-                                "ownerReferences": [
-                                    {
-                                        "apiVersion": recursive_get(i, "apiVersion"),
-                                        "blockOwnerDeletion": True,
-                                        "controller": False,
-                                        "kind": recursive_get(i, "kind"),
-                                        "name": recursive_get(i, "metadata.name"),
-                                        "uid": recursive_get(i, "metadata.uid"),
-                                    }
-                                    for i in (await self.items)[await self.parent_kind]
-                                    if (await self.owner_references)
-                                    and recursive_get(i, "metadata.namespace") == n
-                                ],
-                            },
-                            "selector": {(await self.labels_domain_name): ""},
-                            "_name": "-".join(
-                                [
-                                    i
-                                    for i in [
-                                        (await self.parent_kind).lower(),
-                                        await self.component,
-                                    ]
-                                    if i
-                                ]
-                            ),
-                        },
-                        {
-                            "domains": [
-                                d
-                                for d in (await self.domains)
-                                if recursive_get(d, "metadata.namespace") == n
-                            ],
-                            "objects": [
-                                o
-                                for o in (await self.objects)
-                                if recursive_get(o, "metadata.namespace") == n
-                            ],
-                        },
-                    ],
+            settings = await self.settings
+            parents = (await self.items)[settings.parent_kind]
+            objects = await self.objects
+            domains = await self.domains
+            with self.stage("namespaces"):
+                logger.info("Getting Namespaces")
+                parents_by_namespace = group_by(
+                    parents, lambda i: recursive_get(i, "metadata.namespace")
                 )
-                for n in {
-                    recursive_get(item, "metadata.namespace")
-                    for item in (await self.items)[await self.parent_kind]
-                }
-            ]
-            if self.dump:
-                with open(
-                    os.path.join(
-                        self.dump,
+                objects_by_namespace = group_by(
+                    objects, lambda o: recursive_get(o, "metadata.namespace")
+                )
+                domains_by_namespace = group_by(
+                    domains, lambda d: recursive_get(d, "metadata.namespace")
+                )
+                self._namespaces = [
+                    reduce(
+                        merge,
+                        [
+                            reduce(common, objects_by_namespace[n]),
+                            {
+                                "metadata": {
+                                    "labels": {settings.labels_domain_name: ""},
+                                    "ownerReferences": [
+                                        owner_reference(i)
+                                        for i in namespace_parents
+                                        if settings.owner_references
+                                    ],
+                                },
+                                "selector": {settings.labels_domain_name: ""},
+                                "_name": "-".join(
+                                    [
+                                        i
+                                        for i in [
+                                            settings.parent_kind.lower(),
+                                            settings.component,
+                                        ]
+                                        if i
+                                    ]
+                                ),
+                            },
+                            {
+                                "domains": domains_by_namespace.get(n, []),
+                                "objects": objects_by_namespace[n],
+                            },
+                        ],
+                    )
+                    for n, namespace_parents in parents_by_namespace.items()
+                ]
+                if self.dump:
+                    self.dump.write(
                         f"alfatemplate-{self.name}-namespaces.yaml",
-                    ),
-                    "w",
-                ) as outfile:
-                    outfile.write(yaml.dump_all(self._namespaces))
-            logger.info(f" - Got {len(self._namespaces)} Namespaces")
+                        partial(yaml.dump_all, self._namespaces),
+                        template=self.name,
+                    )
+                logger.info(f" - Got {len(self._namespaces)} Namespaces")
         return self._namespaces
 
     @property
     async def clusters(self):
         if "_clusters" not in self.__dict__ or self._clusters is None:
-            logger.info("Getting Clusters")
-            self._clusters = [
-                reduce(
-                    merge,
-                    [
-                        reduce(common, (await self.objects)),
-                        {"metadata": {"namespace": None}},
-                        {
-                            "namespaces": (await self.namespaces),
-                            "domains": (await self.domains),
-                            "objects": (await self.objects),
-                        },
-                    ],
-                )
-            ]
-            if self.dump:
-                with open(
-                    os.path.join(
-                        self.dump,
+            objects = await self.objects
+            namespaces = await self.namespaces
+            domains = await self.domains
+            with self.stage("clusters"):
+                logger.info("Getting Clusters")
+                self._clusters = [
+                    reduce(
+                        merge,
+                        [
+                            reduce(common, objects),
+                            {"metadata": {"namespace": None}},
+                            {
+                                "namespaces": namespaces,
+                                "domains": domains,
+                                "objects": objects,
+                            },
+                        ],
+                    )
+                ]
+                if self.dump:
+                    self.dump.write(
                         f"alfatemplate-{self.name}-clusters.yaml",
-                    ),
-                    "w",
-                ) as outfile:
-                    outfile.write(yaml.dump_all(self._clusters))
-            logger.info(f" - Got {len(self._clusters)} Clusters")
+                        partial(yaml.dump_all, self._clusters),
+                        template=self.name,
+                    )
+                logger.info(f" - Got {len(self._clusters)} Clusters")
         return self._clusters
 
     @property
     async def renders(self):
         if "_renders" not in self.__dict__ or self._renders is None:
+            self._renders = await self.get_renders(
+                await getattr(self, f"{(await self.settings).scope.lower()}s")
+            )
+        return self._renders
+
+    async def get_renders(self, elements):
+        settings = await self.settings
+        items = await self.items
+        with self.stage("renders"):
             logger.info("Getting Renders")
-            self._renders = [
+            self.jinja.clear_indexes(items.values())
+            renders = [
                 merge(
                     m,
                     {
@@ -348,28 +357,14 @@ class Renderer:
                                     [
                                         i
                                         for i in [
-                                            recursive_get(
-                                                m,
-                                                f"metadata#labels#{await self.labels_name}",
-                                                sep="#",
-                                            ),
-                                            recursive_get(
-                                                m,
-                                                f"metadata#labels#{await self.labels_instance}",
-                                                sep="#",
-                                            ),
+                                            path_get(m, settings.labels_name_path),
+                                            path_get(m, settings.labels_instance_path),
                                             cheap_hash(
-                                                recursive_get(
-                                                    m,
-                                                    f"metadata#labels#{await self.labels_domain_name}",
-                                                    sep="#",
+                                                path_get(
+                                                    m, settings.labels_domain_name_path
                                                 )
                                             ),
-                                            recursive_get(
-                                                m,
-                                                f"metadata#labels#{await self.labels_component}",
-                                                sep="#",
-                                            ),
+                                            path_get(m, settings.labels_component_path),
                                         ]
                                         if i
                                     ]
@@ -383,42 +378,24 @@ class Renderer:
                         {i: x[i] for i in x if i in ["apiVersion", "kind", "metadata"]},
                         r,
                     )
-                    for x in await getattr(self, f"{(await self.scope).lower()}s")
+                    for x in elements
                     for r in yaml.load_all(
                         self.jinja.render(
-                            recursive_get(await self.template, "spec.template"),
-                            parent=(await self.parent),
-                            child=(await self.child),
+                            settings.template,
+                            parent=settings.parent,
+                            child=settings.child,
                             namespace=recursive_get(x, "metadata.namespace"),
-                            name=recursive_get(
-                                x, f"metadata#labels#{await self.labels_name}", sep="#"
-                            ),
-                            instance=recursive_get(
-                                x,
-                                f"metadata#labels#{await self.labels_instance}",
-                                sep="#",
-                            ),
-                            domain_name=recursive_get(
-                                x,
-                                f"metadata#labels#{await self.labels_domain_name}",
-                                sep="#",
-                            ),
-                            component=recursive_get(
-                                x,
-                                f"metadata#labels#{await self.labels_component}",
-                                sep="#",
-                            ),
-                            managed_by=recursive_get(
-                                x,
-                                f"metadata#labels#{await self.labels_managed_by}",
-                                sep="#",
-                            ),
-                            labels_component=await self.labels_component,
-                            labels_domain_name=await self.labels_domain_name,
-                            labels_instance=await self.labels_instance,
-                            labels_managed_by=await self.labels_managed_by,
-                            labels_name=await self.labels_name,
-                            **(await self.items),
+                            name=path_get(x, settings.labels_name_path),
+                            instance=path_get(x, settings.labels_instance_path),
+                            domain_name=path_get(x, settings.labels_domain_name_path),
+                            component=path_get(x, settings.labels_component_path),
+                            managed_by=path_get(x, settings.labels_managed_by_path),
+                            labels_component=settings.labels_component,
+                            labels_domain_name=settings.labels_domain_name,
+                            labels_instance=settings.labels_instance,
+                            labels_managed_by=settings.labels_managed_by,
+                            labels_name=settings.labels_name,
+                            **items,
                             **x,
                         )
                         or "",
@@ -427,72 +404,19 @@ class Renderer:
                 ]
             ]
             if self.dump:
-                with open(
-                    os.path.join(self.dump, f"alfatemplate-{self.name}-renders.yaml"),
-                    "w",
-                ) as outfile:
-                    outfile.write(yaml.dump_all(self._renders))
-            logger.info(f" - Got {len(self._renders)} Renders")
-        return self._renders
-
-    @property
-    async def owner_references(self):
-        return recursive_get(await self.template, "spec.ownerReferences")
-
-    @property
-    async def component(self):
-        return recursive_get(await self.template, "spec.component")
-
-    @property
-    async def labels_name(self):
-        return recursive_get(await self.template, "spec.labels.name")
-
-    @property
-    async def labels_instance(self):
-        return recursive_get(await self.template, "spec.labels.instance")
-
-    @property
-    async def labels_domain_name(self):
-        return recursive_get(await self.template, "spec.labels.domainName")
-
-    @property
-    async def labels_component(self):
-        return recursive_get(await self.template, "spec.labels.component")
-
-    @property
-    async def labels_managed_by(self):
-        return recursive_get(await self.template, "spec.labels.managedBy")
-
-    @property
-    async def kinds(self):
-        return [(await self.parent_kind), *(await self.monitored_kinds)]
-
-    @property
-    async def child(self):
-        return self.api.kinds[await self.child_kind]
-
-    @property
-    async def child_kind(self):
-        return recursive_get(await self.template, "spec.kinds.child.kind")
-
-    @property
-    async def scope(self):
-        return recursive_get(await self.template, "spec.scope")
-
-    @property
-    async def parent(self):
-        return self.api.kinds[await self.parent_kind]
-
-    @property
-    async def parent_kind(self):
-        return recursive_get(await self.template, "spec.kinds.parent.kind")
+                self.dump.write(
+                    f"alfatemplate-{self.name}-renders.yaml",
+                    partial(yaml.dump_all, renders),
+                    template=self.name,
+                )
+            logger.info(f" - Got {len(renders)} Renders")
+        return renders
 
     @property
-    async def monitored_kinds(self):
-        return [
-            k["kind"]
-            for k in recursive_get(await self.template, "spec.kinds.monitored")
-        ]
+    async def settings(self):
+        if "_settings" not in self.__dict__ or self._settings is None:
+            self._settings = Settings(await self.template, self.api)
+        return self._settings
 
     @property
     async def template(self):
@@ -504,33 +428,42 @@ class Renderer:
                 if t["metadata"]["name"] == self.name
             ]
             if self.dump:
-                with open(
-                    os.path.join(
-                        self.dump,
-                        f"alfatemplate-{self.name}-template.yaml",
-                    ),
-                    "w",
-                ) as outfile:
-                    outfile.write(yaml.dump_all(self._template))
+                self.dump.write(
+                    f"alfatemplate-{self.name}-template.yaml",
+                    partial(yaml.dump_all, self._template),
+                    template=self.name,
+                )
             logger.info(f" - Got {len(self._template)} Template(s)")
         return first(self._template)
 
     async def get_items(self, kind):
-        items = []
-        async with self.session.request(
-            "get", self.api.kinds[kind].rest_path
-        ) as item_collection_response:
-            item_collection = await item_collection_response.json()
-            for item in item_collection["items"]:
-                async with self.session.request(
-                    "get",
-                    URL(
-                        self.api.kinds[kind].calculate_url(
-                            item["metadata"].get("namespace", None),
-                            item["metadata"]["name"],
-                        )
-                    ),
-                ) as item_response:
-                    item = await item_response.json()
-                    items.append(item)
+        if kind in self.caches:
+            await self.caches[kind].synced.wait()
+            return self.caches[kind].values()
+        items, _ = await list_items(self.session, self.api, kind)
         return items
+
+
+def object_selector(settings, item):
+    return {
+        settings.labels_name: path_get(item, settings.labels_name_path)
+        or settings.parent_kind.lower(),
+        settings.labels_instance: path_get(item, settings.labels_instance_path)
+        or recursive_get(item, "metadata.name", default=""),
+        settings.labels_domain_name: path_get(item, settings.labels_domain_name_path)
+        or recursive_get(item, "spec.domainName", default=""),
+        settings.labels_component: path_get(item, settings.labels_component_path)
+        or settings.component
+        or "",
+    }
+
+
+def owner_reference(item):
+    return {
+        "apiVersion": recursive_get(item, "apiVersion"),
+        "blockOwnerDeletion": True,
+        "controller": False,
+        "kind": recursive_get(item, "kind"),
+        "name": recursive_get(item, "metadata.name"),
+        "uid": recursive_get(item, "metadata.uid"),
+    }
@@ -0,0 +1,67 @@
+from asyncio import Queue, TimeoutError, wait_for
+from time import monotonic
+
+from illallangi.alfa.metrics import RENDER_BATCH
+
+from loguru import logger
+
+DEBOUNCE = 1.0
+MAX_LATENCY = 10.0
+MIN_INTERVAL = 5.0
+
+
+class Scheduler:
+    def __init__(
+        self,
+        queue,
+        name=None,
+        debounce=DEBOUNCE,
+        max_latency=MAX_LATENCY,
+        min_interval=MIN_INTERVAL,
+    ):
+        self.queue = queue
+        self.name = name
+        if not isinstance(self.queue, Queue):
+            raise TypeError("Expected Queue; got %s" % type(self.queue).__name__)
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.min_interval = min_interval
+        self.rendered = None
+        self.events = 0
+        self.renders = 0
+
+    @property
+    def ratio(self):
+        "events batched into each render"
+        return self.events / self.renders if self.renders else 0.0
+
+    async def next(self):
+        "returns the events to render once the queue has been quiet for the debounce period"
+        # Calling next again means the previous batch has been rendered
+        if self.renders:
+            self.rendered = monotonic()
+        logger.debug("sleeping until next event")
+        queued = [await self.queue.get()]
+        first = monotonic()
+        not_before = 0 if self.rendered is None else self.rendered + self.min_interval
+        while True:
+            deadline = max(
+                min(monotonic() + self.debounce, first + self.max_latency),
+                not_before,
+            )
+            if not self.queue.empty():
+                queued.append(self.queue.get_nowait())
+                continue
+            try:
+                queued.append(
+                    await wait_for(self.queue.get(), max(deadline - monotonic(), 0))
+                )
+            except TimeoutError:
+                break
+        self.events += len(queued)
+        self.renders += 1
+        RENDER_BATCH.labels(self.name).observe(len(queued))
+        logger.info(
+            f"rendering {len(queued)} events after {monotonic() - first:.1f} seconds, {self.ratio:.1f} events per render"
+        )
+        return queued
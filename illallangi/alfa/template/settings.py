@@ -0,0 +1,72 @@
+from illallangi.alfa.functions import recursive_get
+
+
+class Settings:
+    "An AlfaTemplate spec resolved once, for synchronous use by render stages"
+
+    __slots__ = (
+        "name",
+        "scope",
+        "template",
+        "component",
+        "owner_references",
+        "update",
+        "parent_kind",
+        "child_kind",
+        "monitored_kinds",
+        "kinds",
+        "parent",
+        "child",
+        "labels_name",
+        "labels_instance",
+        "labels_domain_name",
+        "labels_component",
+        "labels_managed_by",
+        "labels_name_path",
+        "labels_instance_path",
+        "labels_domain_name_path",
+        "labels_component_path",
+        "labels_managed_by_path",
+    )
+
+    def __init__(self, template, api):
+        values = {
+            "name": recursive_get(template, "metadata.name"),
+            "scope": recursive_get(template, "spec.scope"),
+            "template": recursive_get(template, "spec.template"),
+            "component": recursive_get(template, "spec.component"),
+            "owner_references": recursive_get(template, "spec.ownerReferences"),
+            "update": recursive_get(template, "spec.update"),
+            "parent_kind": recursive_get(template, "spec.kinds.parent.kind"),
+            "child_kind": recursive_get(template, "spec.kinds.child.kind"),
+            "monitored_kinds": tuple(
+                k["kind"] for k in recursive_get(template, "spec.kinds.monitored")
+            ),
+            "labels_name": recursive_get(template, "spec.labels.name"),
+            "labels_instance": recursive_get(template, "spec.labels.instance"),
+            "labels_domain_name": recursive_get(template, "spec.labels.domainName"),
+            "labels_component": recursive_get(template, "spec.labels.component"),
+            "labels_managed_by": recursive_get(template, "spec.labels.managedBy"),
+        }
+        values["kinds"] = (values["parent_kind"], *values["monitored_kinds"])
+        values["parent"] = api.kinds[values["parent_kind"]]
+        values["child"] = api.kinds[values["child_kind"]]
+        for label in [
+            "labels_name",
+            "labels_instance",
+            "labels_domain_name",
+            "labels_component",
+            "labels_managed_by",
+        ]:
+            values[f"{label}_path"] = ("metadata", "labels", values[label])
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
@@ -0,0 +1,93 @@
+from asyncio import Event, TimeoutError, sleep, wait_for
+from random import uniform
+from time import monotonic
+
+from loguru import logger
+
+BASE_DELAY = 1.0
+MAX_DELAY = 300.0
+RETRY_RATE = 1.0
+RETRY_BURST = 10
+
+
+class TokenBucket:
+    "A retry budget that may be shared by the work queues of every template"
+
+    def __init__(self, rate=RETRY_RATE, burst=RETRY_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled = monotonic()
+
+    async def take(self):
+        "waits for a token from the retry budget"
+        while True:
+            now = monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.refilled) * self.rate
+            )
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await sleep((1 - self.tokens) / self.rate)
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+        bucket=None,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket() if bucket is None else bucket
+        if not isinstance(self.bucket, TokenBucket):
+            raise TypeError("Expected TokenBucket; got %s" % type(self.bucket).__name__)
+        self.failures = {}
+        self.pending = {}
+        self.changed = Event()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def retry(self, key, item):
+        "schedules item for another attempt after the key's backoff"
+        self.failures[key] = self.failures.get(key, 0) + 1
+        delay = min(self.base_delay * 2 ** (self.failures[key] - 1), self.max_delay)
+        due = monotonic() + uniform(delay / 2, delay)
+        # A key is only queued once; the newest item replaces the older one
+        if key in self.pending:
+            due = min(due, self.pending[key][0])
+        self.pending[key] = (due, item)
+        logger.debug(
+            f"retrying {key} in {due - monotonic():.1f} seconds after {self.failures[key]} failures"
+        )
+        self.changed.set()
+
+    def forget(self, key):
+        "clears the backoff of a key that no longer needs retrying"
+        self.failures.pop(key, None)
+        if self.pending.pop(key, None) is not None:
+            self.changed.set()
+
+    async def get(self):
+        "returns the next key and item once both its backoff and the rate limit allow"
+        while True:
+            self.changed.clear()
+            if not self.pending:
+                await self.changed.wait()
+                continue
+            key, (due, item) = min(self.pending.items(), key=lambda p: p[1][0])
+            if due > monotonic():
+                try:
+                    await wait_for(self.changed.wait(), due - monotonic())
+                except TimeoutError:
+                    pass
+                continue
+            await self.bucket.take()
+            # The key may have been forgotten or rescheduled while rate limited
+            if self.pending.get(key, (None, None))[1] is item:
+                del self.pending[key]
+                return key, item
@@ -1,45 +1,218 @@
-from asyncio import ensure_future, get_event_loop
+from asyncio import (
+    Queue,
+    QueueFull,
+    TimeoutError,
+    ensure_future,
+    gather,
+    get_event_loop,
+    sleep,
+    wait_for,
+)
 from sys import stderr
+from time import monotonic
 
-from click import Choice as CHOICE, Path as PATH, STRING, command, option
+from click import (
+    Choice as CHOICE,
+    FLOAT,
+    FloatRange as FLOAT_RANGE,
+    INT,
+    IntRange as INT_RANGE,
+    Path as PATH,
+    STRING,
+    UsageError,
+    command,
+    option,
+)
 
 from illallangi.alfa.cluster import Controller
+from illallangi.alfa.dump import (
+    BACKENDS,
+    BlobBackend,
+    DumpWriter,
+    POLICIES,
+    QUEUE_SIZE,
+)
+from illallangi.alfa.metrics import serve
+from illallangi.alfa.profiling import install
+from illallangi.alfa.recorder import Recorder
 
 from loguru import logger
 
-from slack_sdk import WebClient
+from slack_sdk.http_retry.builtin_async_handlers import (
+    AsyncRateLimitErrorRetryHandler,
+)
+from slack_sdk.web.async_client import AsyncWebClient
+
+SLACK_CHANNEL = "#general"
+SLACK_QUEUE_SIZE = 1000
+SLACK_RATE = 1.0
+SLACK_WINDOW = 5.0
+SLACK_LINES = 50
+SLACK_WARNING_INTERVAL = 60.0
 
 
 class SlackHandler(object):
-    def __init__(self, token, *args, **kwargs):
+    "loguru sink posting one digest per template render pass to Slack"
+
+    def __init__(
+        self,
+        token,
+        *args,
+        channel=SLACK_CHANNEL,
+        queue_size=SLACK_QUEUE_SIZE,
+        rate=SLACK_RATE,
+        window=SLACK_WINDOW,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.token = token
-        self.client = WebClient(self.token)
+        self.channel = channel
+        self.rate = rate
+        self.window = window
+        self.client = AsyncWebClient(self.token)
+        self.client.retry_handlers.append(AsyncRateLimitErrorRetryHandler())
+        self.queue = Queue(maxsize=queue_size)
+        self.digests = {}
+        self.dropped = 0
+        self.available = 0
+        self.failures = 0
+        self.warned = None
 
     def write(self, message):
-        result = self.client.chat_postMessage(
-            channel="#general",
-            text=f'Template {message.record["extra"]["template"]} processed {message.record["extra"]["render"]}, {message.record["message"]}',
-            blocks=[
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f'Template {message.record["extra"]["template"]} processed {message.record["extra"]["render"]}, {message.record["message"]}',
-                    },
-                }
-            ],
+        # Called inline by every logging call, so only queue the record
+        if "render" not in message.record["extra"]:
+            return
+        try:
+            self.queue.put_nowait(message.record)
+        except QueueFull:
+            self.dropped += 1
+
+    async def loop(self):
+        while True:
+            try:
+                record = await wait_for(self.queue.get(), self.timeout)
+            except TimeoutError:
+                record = None
+            if record is not None:
+                key = (
+                    record["extra"].get("template"),
+                    record["extra"].get("render_pass"),
+                )
+                # A new pass of a template means its previous pass has finished,
+                # retries and reconciles outside a pass wait for the window
+                for previous in [
+                    k
+                    for k in self.digests
+                    if k[0] == key[0] and None not in [k[1], key[1]] and k != key
+                ]:
+                    await self.post(previous)
+                self.digests.setdefault(key, {"records": []})
+                self.digests[key]["records"].append(record)
+                self.digests[key]["updated"] = monotonic()
+            for key in [
+                k
+                for k, v in self.digests.items()
+                if monotonic() - v["updated"] >= self.window
+            ]:
+                await self.post(key)
+
+    @property
+    def timeout(self):
+        "seconds until the oldest open digest is due"
+        if not self.digests:
+            return None
+        return max(
+            min(v["updated"] for v in self.digests.values())
+            + self.window
+            - monotonic(),
+            0,
         )
 
-        for file in message.record["extra"].get("files", []):
-            self.client.files_upload(
-                channels="#general",
-                content=file["yaml"],
-                filename=file["filename"],
-                filetype="javascript",
-                title=file["title"],
-                thread_ts=result["ts"],
+    async def flush(self):
+        "posts every open digest"
+        while not self.queue.empty():
+            record = self.queue.get_nowait()
+            self.digests.setdefault(
+                (
+                    record["extra"].get("template"),
+                    record["extra"].get("render_pass"),
+                ),
+                {"records": []},
+            )["records"].append(record)
+        for key in list(self.digests):
+            await self.post(key)
+
+    async def post(self, key):
+        records = self.digests.pop(key)["records"]
+        template, render_pass = key
+        if self.dropped:
+            records = records + [
+                {
+                    "extra": {"render": "slack"},
+                    "message": f"{self.dropped} notifications dropped",
+                }
+            ]
+            self.dropped = 0
+        title = f'Template {template} processed {len(records)} change{"s" if len(records) != 1 else ""}{"" if render_pass is None else f" in render pass {render_pass}"}'
+        lines = [f'{r["extra"]["render"]}, {r["message"]}' for r in records]
+        if len(lines) > SLACK_LINES:
+            lines = lines[:SLACK_LINES] + [f"and {len(lines) - SLACK_LINES} more"]
+        files = [f for r in records for f in r["extra"].get("files", [])]
+        try:
+            await self.throttle()
+            result = await self.client.chat_postMessage(
+                channel=self.channel,
+                text=title,
+                blocks=[
+                    {
+                        "type": "section",
+                        "text": {
+                            "type": "mrkdwn",
+                            "text": "\n".join([f"*{title}*"] + lines),
+                        },
+                    }
+                ],
             )
+            if files:
+                await self.throttle()
+                await self.client.files_upload_v2(
+                    # files.completeUploadExternal takes a channel ID, not a name
+                    channel=result["channel"],
+                    # File payloads are built lazily, off the event loop
+                    content=await get_event_loop().run_in_executor(
+                        None, attachment, files
+                    ),
+                    filename=f"alfatemplate-{template}-{render_pass or 'changes'}.yaml",
+                    snippet_type="javascript",
+                    title=f"{len(files)} file{'s' if len(files) != 1 else ''}",
+                    thread_ts=result["ts"],
+                )
+        except Exception as e:
+            self.failures += 1
+            # Warn at most once an interval, so a broken sink cannot flood the log
+            if (
+                self.warned is None
+                or monotonic() - self.warned >= SLACK_WARNING_INTERVAL
+            ):
+                logger.warning(
+                    f"error posting to slack: {repr(e)} ({self.failures} failures)"
+                )
+                self.warned = monotonic()
+
+    async def throttle(self):
+        "waits until the next call fits within rate calls a second"
+        delay = self.available - monotonic()
+        if delay > 0:
+            await sleep(delay)
+        self.available = max(self.available, monotonic()) + 1 / self.rate
+
+
+def attachment(files):
+    "joins the files of a digest, resolving lazily built payloads"
+    return "\n".join(
+        f'# {f["title"]}\n# {f["filename"]}\n{f["yaml"]() if callable(f["yaml"]) else f["yaml"]}'
+        for f in files
+    )
 
 
 def log_format(record):
@@ -86,6 +259,112 @@ def log_format(record):
     ),
     envvar="ALFA_DUMP",
 )
+@option(
+    "--dump-policy",
+    default="drop",
+    show_default=True,
+    type=CHOICE(POLICIES),
+    envvar="ALFA_DUMP_POLICY",
+)
+@option(
+    "--dump-queue-size",
+    default=QUEUE_SIZE,
+    show_default=True,
+    type=INT,
+    envvar="ALFA_DUMP_QUEUE_SIZE",
+)
+@option(
+    "--dump-backend",
+    default="files",
+    show_default=True,
+    type=CHOICE(BACKENDS),
+    envvar="ALFA_DUMP_BACKEND",
+)
+@option(
+    "--dump-max-size",
+    default=None,
+    show_default=False,
+    type=INT,
+    envvar="ALFA_DUMP_MAX_SIZE",
+)
+@option(
+    "--dump-max-age",
+    default=None,
+    show_default=False,
+    type=FLOAT,
+    envvar="ALFA_DUMP_MAX_AGE",
+)
+@option(
+    "--jinja-cache",
+    default=None,
+    show_default=False,
+    type=PATH(
+        exists=False,
+        file_okay=False,
+        dir_okay=True,
+        writable=True,
+        readable=True,
+        resolve_path=True,
+        allow_dash=False,
+    ),
+    envvar="ALFA_JINJA_CACHE",
+)
+@option(
+    "--concurrency",
+    default=32,
+    show_default=True,
+    type=INT_RANGE(min=1),
+    envvar="ALFA_CONCURRENCY",
+)
+@option(
+    "--debounce",
+    default=1.0,
+    show_default=True,
+    type=FLOAT_RANGE(min=0),
+    envvar="ALFA_DEBOUNCE",
+)
+@option(
+    "--max-latency",
+    default=10.0,
+    show_default=True,
+    type=FLOAT_RANGE(min=0),
+    envvar="ALFA_MAX_LATENCY",
+)
+@option(
+    "--min-interval",
+    default=5.0,
+    show_default=True,
+    type=FLOAT_RANGE(min=0),
+    envvar="ALFA_MIN_INTERVAL",
+)
+@option(
+    "--metrics-port",
+    default=None,
+    show_default=False,
+    type=INT,
+    envvar="ALFA_METRICS_PORT",
+)
+@option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    envvar="ALFA_PROFILE",
+)
+@option(
+    "--record",
+    default=None,
+    show_default=False,
+    type=PATH(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+        writable=True,
+        readable=False,
+        resolve_path=True,
+        allow_dash=False,
+    ),
+    envvar="ALFA_RECORD",
+)
 @option(
     "--api",
     default="http://localhost:8001",
@@ -98,17 +377,74 @@ def cli(
     slack_token,
     api,
     dump,
+    dump_policy,
+    dump_queue_size,
+    dump_backend,
+    dump_max_size,
+    dump_max_age,
+    jinja_cache,
+    concurrency,
+    debounce,
+    max_latency,
+    min_interval,
+    metrics_port,
+    profile,
+    record,
     parent,
 ):
     logger.remove()
     logger.add(stderr, format=log_format, level=log_level)
+    slack = None
     if slack_token:
         slack = SlackHandler(token=slack_token)
         logger.add(slack, level="SUCCESS")
+    if metrics_port:
+        serve(metrics_port)
+    if profile and not dump:
+        raise UsageError("--profile writes its output to --dump")
+    if dump_backend != "blobs" and (dump_max_size or dump_max_age):
+        raise UsageError("--dump-max-size and --dump-max-age need --dump-backend blobs")
+    if dump:
+        install(profile)
+        dump = DumpWriter(
+            dump,
+            policy=dump_policy,
+            queue_size=dump_queue_size,
+            backend=(
+                BlobBackend(dump, max_size=dump_max_size, max_age=dump_max_age)
+                if dump_backend == "blobs"
+                else None
+            ),
+        )
 
-    controller = Controller(api, dump, parent)
+    controller = Controller(
+        api,
+        dump,
+        parent,
+        jinja_cache=jinja_cache,
+        concurrency=concurrency,
+        schedule={
+            "debounce": debounce,
+            "max_latency": max_latency,
+            "min_interval": min_interval,
+        },
+        recorder=None if record is None else Recorder(record),
+    )
 
-    get_event_loop().run_until_complete(ensure_future(controller.loop()))
+    try:
+        get_event_loop().run_until_complete(
+            gather(
+                ensure_future(controller.loop()),
+                *([] if slack is None else [slack.loop()]),
+            )
+        )
+    finally:
+        if slack is not None:
+            get_event_loop().run_until_complete(slack.flush())
+        if controller.recorder is not None:
+            controller.recorder.close()
+        if controller.dump is not None:
+            controller.dump.close()
 
 
 if __name__ == "__main__":
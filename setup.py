@@ -30,6 +30,7 @@ setuptools.setup(
         "jmespath",
         "more_itertools",
         "netaddr",
+        "prometheus_client",
         "pyyaml",
         "requests",
         "six",